@@ -73,6 +73,7 @@ setup(
         create-mapping = contentbase.elasticsearch.create_mapping:main
 
         add-date-created = clincoded.commands.add_date_created:main
+        benchmark = clincoded.commands.benchmark:main
         check-files = clincoded.commands.check_files:main
         check-rendering = clincoded.commands.check_rendering:main
         deploy = clincoded.commands.deploy:main
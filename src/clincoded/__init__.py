@@ -116,7 +116,7 @@ def load_workbook(app, workbook_filename, docsdir, test=False):
         'REMOTE_USER': 'IMPORT',
     }
     testapp = TestApp(app, environ)
-    load_all(testapp, workbook_filename, docsdir, test=test)
+    load_all(testapp, workbook_filename, docsdir, test=test, batch_size=100)
 
 
 def json_from_path(path, default=None):
@@ -180,7 +180,9 @@ def main(global_config, **local_config):
 
     # Render an HTML page to browsers and a JSON document for API clients
     config.include('.renderers')
+    config.include('.html_cache')
     config.include('.authentication')
+    config.include('.authorization')
     config.include('.server_defaults')
     config.include('.types')
     config.include('.root')
@@ -1,51 +1,113 @@
 from contentbase import LOCATION_ROOT
+from contentbase.cache import DependencyLRUCache
+from contentbase.stats import stats_incr
+from contentbase.util import get_root_request
+import logging
+
+log = logging.getLogger(__name__)
+
+PRINCIPALS_CACHE = 'principals_cache'
+
+
+def includeme(config):
+    from contentbase.invalidation import (
+        listen_for_invalidation,
+        listener_engine,
+    )
+    settings = config.registry.settings
+    capacity = int(settings.get('clincoded.principals_cache.capacity', 0))
+    if not capacity:
+        return
+    # Without a listener other processes would keep stale principals.
+    if listener_engine() is None:
+        log.warning('Principals cache disabled, cannot listen for invalidations')
+        return
+    config.registry[PRINCIPALS_CACHE] = DependencyLRUCache(capacity)
+    listen_for_invalidation(config, invalidate_principals_cache)
+
+
+def invalidate_principals_cache(event):
+    cache = event.registry[PRINCIPALS_CACHE]
+    if event.everything:
+        cache.clear()
+    else:
+        cache.invalidate(event.updated)
 
 
 def groupfinder(login, request):
+    """ Principals for a login, cached until its user or access key is updated.
+
+    The cache is bypassed once the request has written anything as the user
+    or access key may have been changed by a transaction yet to commit.
+    """
+    cache = request.registry.get(PRINCIPALS_CACHE)
+    root_request = get_root_request() or request
+    if cache is None or root_request._updated_uuid_paths:
+        return _groupfinder(login, request)[0]
+
+    cached = cache.get(login)
+    if cached is not None:
+        stats_incr('principals_cache_hits')
+        return list(cached[0])
+
+    stats_incr('principals_cache_misses')
+    generation = cache.generation
+    principals, uuids = _groupfinder(login, request)
+    if principals is not None:
+        cache.set(login, tuple(principals), uuids, generation=generation)
+    return principals
+
+
+def _groupfinder(login, request):
+    """ Returns the principals and the uuids they were computed from.
+    """
     if '.' not in login:
-        return None
+        return None, ()
     namespace, localname = login.split('.', 1)
     user = None
+    uuids = []
     # We may get called before the context is found and the root set
     root = request.registry[LOCATION_ROOT]
 
     if namespace == 'remoteuser':
         if localname in ['EMBED', 'INDEXER']:
-            return []
+            return [], ()
         elif localname in ['TEST', 'IMPORT', 'UPGRADE']:
-            return ['group.admin']
+            return ['group.admin'], ()
         elif localname in ['TEST_SUBMITTER']:
-            return ['group.submitter']
+            return ['group.submitter'], ()
         elif localname in ['TEST_AUTHENTICATED']:
-            return ['viewing_group.ENCODE']
+            return ['viewing_group.ENCODE'], ()
 
     if namespace in ('mailto', 'remoteuser', 'auth0'):
         users = root.by_item_type['user']
         try:
             user = users[localname]
         except KeyError:
-            return None
+            return None, ()
 
     elif namespace == 'accesskey':
         access_keys = root.by_item_type['access_key']
         try:
             access_key = access_keys[localname]
         except KeyError:
-            return None
+            return None, ()
 
+        uuids.append(str(access_key.uuid))
         if access_key.properties.get('status') in ('deleted', 'disabled'):
-            return None
+            return None, ()
 
         userid = access_key.properties['user']
         user = root.by_item_type['user'][userid]
 
     if user is None:
-        return None
+        return None, ()
 
+    uuids.append(str(user.uuid))
     user_properties = user.properties
 
     if user_properties.get('status') in ('deleted', 'disabled'):
-        return None
+        return None, ()
 
     principals = ['userid.%s' % user.uuid]
     lab = user_properties.get('lab')
@@ -60,4 +122,4 @@ def groupfinder(login, request):
     principals.extend('group.%s' % group for group in groups)
     viewing_groups = user_properties.get('viewing_groups', [])
     principals.extend('viewing_group.%s' % group for group in viewing_groups)
-    return principals
+    return principals, uuids
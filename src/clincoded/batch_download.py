@@ -2,6 +2,7 @@ from collections import OrderedDict
 from pyramid.view import view_config
 from pyramid.response import Response
 from contentbase import simple_path_ids
+from .search import iter_search_results
 from urllib.parse import (
     parse_qs,
     urlencode,
@@ -78,11 +79,19 @@ def metadata_tsv(context, request):
         param_list['field'] = param_list['field'] + _tsv_mapping[prop]
         if _tsv_mapping[prop][0].startswith('files'):
             file_attributes = file_attributes + [_tsv_mapping[prop][0]]
-    param_list['limit'] = ['all']
-    path = '/search/?%s' % urlencode(param_list, True)
-    results = request.embed(path, as_user=True)
-    rows = []
-    for row in results['@graph']:
+    results = iter_search_results(request, param_list)
+    rows = metadata_rows(request, header, file_attributes, param_list, results)
+    return Response(
+        content_type='text/tsv',
+        app_iter=tsv_app_iter(header, rows),
+        content_disposition='attachment;filename="%s"' % 'metadata.tsv'
+    )
+
+
+def metadata_rows(request, header, file_attributes, param_list, results):
+    """ Yields one tsv row per file of each search result
+    """
+    for row in results:
         if row['files']:
             exp_data_row = []
             for column in header:
@@ -144,16 +153,22 @@ def metadata_tsv(context, request):
                         if 'replicate' in f and 'rbns_protein_concentration_units' in f['replicate']:
                             temp[0] = temp[0] + ' ' + f['replicate']['rbns_protein_concentration_units']
                     data_row.append(', '.join(list(set(temp))))
-                rows.append(data_row)
+                yield data_row
+
+
+def tsv_app_iter(header, rows, buffer_size=64 * 1024):
+    """ Writes rows as tab separated values, yielding encoded chunks
+    """
     fout = io.StringIO()
     writer = csv.writer(fout, delimiter='\t')
     writer.writerow(header)
-    writer.writerows(rows)
-    return Response(
-        content_type='text/tsv',
-        body=fout.getvalue(),
-        content_disposition='attachment;filename="%s"' % 'metadata.tsv'
-    )
+    for row in rows:
+        writer.writerow(row)
+        if fout.tell() >= buffer_size:
+            yield fout.getvalue().encode('utf-8')
+            fout.seek(0)
+            fout.truncate()
+    yield fout.getvalue().encode('utf-8')
 
 
 @view_config(route_name='batch_download', request_method='GET')
@@ -0,0 +1,341 @@
+"""\
+Benchmark performance sensitive code paths
+
+Examples
+
+Stream a 100k row metadata.tsv export and report memory usage:
+
+    %(prog)s metadata-tsv --rows 100000
+
+Compare against building every row in memory first:
+
+    %(prog)s metadata-tsv --rows 100000 --materialize
+
+Load the test workbook into an empty database, independent types in parallel:
+
+    %(prog)s load-workbook development.ini --app-name app --processes 4
+
+Compare against the serial loader on another empty database:
+
+    %(prog)s load-workbook development.ini --app-name app --serial
+
+Measure validations/sec for each schema against the test inserts:
+
+    %(prog)s validate development.ini --app-name app
+
+Time each JSON backend rendering GDM @@embedded documents and a search page:
+
+    %(prog)s render-json development.ini --app-name app --backend json --backend orjson
+
+Time @@embedded for the GDM with the most embedded objects:
+
+    %(prog)s embed-gdm development.ini --app-name app
+
+"""
+import json
+import logging
+import psutil
+import time
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+
+def rss_mb(process):
+    return process.memory_info().rss / (1024.0 ** 2)
+
+
+def synthetic_experiments(count):
+    """ Search results shaped like the experiment documents metadata_tsv expects
+    """
+    for i in range(count):
+        accession = 'ENCSR%06d' % i
+        yield {
+            'accession': accession,
+            'assay_term_name': 'ChIP-seq',
+            'biosample_term_id': 'EFO:0002067',
+            'biosample_term_name': 'K562',
+            'biosample_type': 'immortalized cell line',
+            'date_released': '2015-01-01',
+            'target': {'name': 'CTCF-human'},
+            'award': {'project': 'ENCODE'},
+            'replicates': [{
+                'library': {
+                    'nucleic_acid_term_name': 'DNA',
+                    'biosample': {
+                        'life_stage': 'adult',
+                        'sex': 'female',
+                        'organism': {'scientific_name': 'Homo sapiens'},
+                    },
+                },
+            }],
+            'files': [{
+                'title': 'ENCFF%06d' % i,
+                'file_type': 'fastq',
+                'output_type': 'reads',
+                'href': '/files/ENCFF%06d/@@download/ENCFF%06d.fastq.gz' % (i, i),
+                'md5sum': '%032x' % i,
+                'file_size': 1024 * i,
+                'read_length': 36,
+                'run_type': 'single-ended',
+                'lab': {'title': 'Lab %d' % (i % 10)},
+                'assembly': 'GRCh38',
+                'platform': {'title': 'Illumina HiSeq 2000'},
+                'replicate': {
+                    'biological_replicate_number': 1,
+                    'technical_replicate_number': 1,
+                },
+            }],
+        }
+
+
+def metadata_tsv(args):
+    from pyramid.request import Request
+    from ..batch_download import (
+        _tsv_mapping,
+        metadata_rows,
+        tsv_app_iter,
+    )
+    request = Request.blank('/metadata/type=experiment/metadata.tsv')
+    header = list(_tsv_mapping)
+    file_attributes = [
+        columns[0] for columns in _tsv_mapping.values() if columns[0].startswith('files')
+    ]
+    process = psutil.Process()
+    baseline = peak = rss_mb(process)
+    begin = time.time()
+
+    rows = metadata_rows(request, header, file_attributes, {}, synthetic_experiments(args.rows))
+    if args.materialize:
+        rows = list(rows)
+
+    written = 0
+    count = 0
+    report = args.sample
+    for chunk in tsv_app_iter(header, rows):
+        written += len(chunk)
+        count += chunk.count(b'\n')
+        current = rss_mb(process)
+        peak = max(peak, current)
+        if count >= report:
+            print('%8d rows %8.1f MB rss' % (count, current))
+            report += args.sample
+
+    duration = time.time() - begin
+    print('rows: %d (including header)' % count)
+    print('bytes: %d' % written)
+    print('time: %.2fs (%.0f rows/sec)' % (duration, count / duration))
+    print('rss: baseline %.1f MB, peak %.1f MB, growth %.1f MB' % (
+        baseline, peak, peak - baseline))
+
+
+def load_workbook(args):
+    from pkg_resources import resource_filename
+    from .. import loadxl
+    from .import_data import internal_app
+    inserts = args.inserts or resource_filename('clincoded', 'tests/data/inserts/')
+    docsdir = [args.docsdir or resource_filename('clincoded', 'tests/data/documents/')]
+    logging.getLogger('clincoded').setLevel(logging.WARNING)
+
+    begin = time.time()
+    if args.serial:
+        testapp = internal_app(args.config_uri, args.app_name)
+        loadxl.load_all(testapp, inserts, docsdir, batch_size=100)
+        timings = None
+    else:
+        timings = loadxl.load_all_parallel(
+            args.config_uri, inserts, docsdir, app_name=args.app_name,
+            processes=args.processes)
+    duration = time.time() - begin
+
+    if timings:
+        for (item_type, phase), item_time in sorted(timings.items(), key=lambda kv: -kv[1]):
+            print('%-30s phase %d %8.2fs' % (item_type, phase, item_time))
+        total = sum(timings.values())
+        print('sum of per type times: %.2fs (%.1fx parallelism)' % (total, total / duration))
+    print('wall time: %.2fs' % duration)
+
+
+def validate_schemas(args):
+    from pkg_resources import resource_filename
+    from pyramid.paster import bootstrap
+    from contentbase import TYPES
+    from contentbase.schema_utils import validate
+    from .. import loadxl
+    import transaction
+    inserts = args.inserts or resource_filename('clincoded', 'tests/data/inserts/')
+    env = bootstrap(args.config_uri, args.app_name and '#' + args.app_name or None)
+    env['request'].remote_user = 'IMPORT'
+    types = env['registry'][TYPES].types
+
+    print('%-30s %8s %12s %12s' % ('schema', 'rows', 'compiled/s', 'uncompiled/s'))
+    try:
+        for item_type, type_info in sorted(types.items()):
+            if item_type.startswith('testing_') or type_info.schema is None:
+                continue
+            rows = [
+                {k: v for k, v in row.items() if not k.startswith('_') and v not in ('', None, [])}
+                for row in loadxl.read_single_sheet(inserts, item_type)
+            ]
+            if not rows:
+                continue
+            rates = []
+            # A copy of the schema is not registered so takes the uncompiled path.
+            for schema in (type_info.schema, dict(type_info.schema)):
+                begin = time.time()
+                count = 0
+                while count < args.number:
+                    for row in rows:
+                        validate(schema, row)
+                        count += 1
+                rates.append(count / (time.time() - begin))
+            print('%-30s %8d %12.0f %12.0f' % (item_type, len(rows), rates[0], rates[1]))
+    finally:
+        transaction.abort()
+        env['closer']()
+
+
+def legacy_json_bytes(value, **kw):
+    """ The previous serializer, json.dump into many small chunks encoded separately
+    """
+    chunks = []
+    json.dump(value, Writer(chunks), **kw)
+    return [chunk.encode('utf-8') for chunk in chunks]
+
+
+class Writer(object):
+    def __init__(self, chunks):
+        self.write = chunks.append
+
+
+def render_json(args):
+    from contentbase.json_renderer import json_renderer
+    from .import_data import internal_app
+    testapp = internal_app(args.config_uri, args.app_name)
+    gdms = testapp.get('/gdm/?limit=all&datastore=database').json['@graph']
+    documents = [
+        testapp.get(gdm['@id'] + '@@embedded').json for gdm in gdms[:args.documents]
+    ]
+    pages = [('gdm @@embedded', documents)]
+    if args.search:
+        pages.append(('search', [testapp.get(args.search).json]))
+    default = json_renderer._make_default(None)
+
+    backends = [('legacy', legacy_json_bytes)]
+    for name in args.backend or ['json']:
+        json_renderer.set_backend(name)
+        backends.append((name, json_renderer.backend.dumpb))
+
+    print('%-16s %-12s %12s %12s' % ('page', 'backend', 'MB/sec', 'docs/sec'))
+    for page, values in pages:
+        for name, serialize in backends:
+            size = 0
+            begin = time.time()
+            for i in range(args.number):
+                for value in values:
+                    result = serialize(value, default=default)
+                    size += len(result) if isinstance(result, bytes) else sum(map(len, result))
+            duration = time.time() - begin
+            print('%-16s %-12s %12.1f %12.0f' % (
+                page, name, size / duration / 1024.0 ** 2, args.number * len(values) / duration))
+
+
+def count_objects(value):
+    if isinstance(value, dict):
+        return 1 + sum(count_objects(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(count_objects(v) for v in value)
+    return 0
+
+
+def embed_gdm(args):
+    from urllib.parse import parse_qsl
+    from .import_data import internal_app
+    testapp = internal_app(args.config_uri, args.app_name)
+    if args.path:
+        path = args.path
+    else:
+        gdms = testapp.get('/gdm/?limit=all&datastore=database').json['@graph']
+        sizes = [
+            (count_objects(testapp.get(gdm['@id'] + '@@embedded?datastore=database').json),
+             gdm['@id'])
+            for gdm in gdms
+        ]
+        if not sizes:
+            print('No gdm found')
+            return
+        objects, path = max(sizes)
+        print('%s embeds %d objects' % (path, objects))
+
+    print('%8s %10s %8s %10s' % ('run', 'wsgi ms', 'queries', 'db ms'))
+    for i in range(args.number):
+        res = testapp.get(path + '@@embedded?datastore=database')
+        stats = dict(parse_qsl(res.headers['X-Stats']))
+        print('%8d %10.1f %8s %10.1f' % (
+            i, int(stats['wsgi_time']) / 1000.0, stats.get('db_count', 0),
+            int(stats.get('db_time', 0)) / 1000.0))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark performance sensitive code paths", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    tsv = subparsers.add_parser('metadata-tsv', help="Streaming metadata.tsv export")
+    tsv.add_argument('--rows', default=100000, type=int, help="Number of rows to export")
+    tsv.add_argument('--sample', default=10000, type=int, help="Report memory every n rows")
+    tsv.add_argument(
+        '--materialize', action='store_true',
+        help="Build all rows in memory before writing, as the old export did")
+    tsv.set_defaults(func=metadata_tsv)
+
+    workbook = subparsers.add_parser(
+        'load-workbook', help="Load a workbook into an empty database")
+    workbook.add_argument('config_uri', help="path to configfile")
+    workbook.add_argument('--app-name', help="Pyramid app name in configfile")
+    workbook.add_argument('--inserts', help="Workbook to load (default: the test workbook)")
+    workbook.add_argument('--docsdir', help="Directory of attachments")
+    workbook.add_argument('--processes', type=int, help="Worker processes")
+    workbook.add_argument('--serial', action='store_true', help="Use the serial loader")
+    workbook.set_defaults(func=load_workbook)
+
+    validation = subparsers.add_parser('validate', help="Schema validations/sec")
+    validation.add_argument('config_uri', help="path to configfile")
+    validation.add_argument('--app-name', help="Pyramid app name in configfile")
+    validation.add_argument('--inserts', help="Rows to validate (default: the test inserts)")
+    validation.add_argument(
+        '--number', default=1000, type=int, help="Validations per schema")
+    validation.set_defaults(func=validate_schemas)
+
+    rendering = subparsers.add_parser('render-json', help="JSON serialization throughput")
+    rendering.add_argument('config_uri', help="path to configfile")
+    rendering.add_argument('--app-name', help="Pyramid app name in configfile")
+    rendering.add_argument(
+        '--backend', action='append', help="JSON backend to compare (default: json)")
+    rendering.add_argument(
+        '--documents', default=100, type=int, help="Number of GDM documents to embed")
+    rendering.add_argument(
+        '--search', default='/search/?type=gdm&limit=all',
+        help="Search page to render, empty to skip")
+    rendering.add_argument('--number', default=10, type=int, help="Repetitions")
+    rendering.set_defaults(func=render_json)
+
+    embedding = subparsers.add_parser('embed-gdm', help="Time @@embedded of a deep GDM")
+    embedding.add_argument('config_uri', help="path to configfile")
+    embedding.add_argument('--app-name', help="Pyramid app name in configfile")
+    embedding.add_argument('--path', help="Item to embed (default: the deepest GDM)")
+    embedding.add_argument('--number', default=10, type=int, help="Repetitions")
+    embedding.set_defaults(func=embed_gdm)
+
+    args = parser.parse_args()
+    logging.basicConfig()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,8 @@ import os.path
 
 EPILOG = __doc__
 
+logger = logging.getLogger(__name__)
+
 
 def basic_auth(username, password):
     from base64 import b64encode
@@ -91,6 +93,8 @@ def main():
     parser.add_argument('--attach', '-a', action='append', default=[],
         help="Directory to search for attachments")
     parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--processes', type=int,
+        help="Load independent types in parallel (configfile only)")
     parser.add_argument('inpath',
         help="input zip file/directory of excel/csv/tsv sheets.")
     parser.add_argument('url',
@@ -121,8 +125,22 @@ def main():
 
     if args.method:
         run(testapp, args.inpath, args.attach, args.method, args.item_type, args.test_only)
-    else:
+    elif url.scheme in ('http', 'https'):
+        # /batch_import is admin only so remote imports keep to a request per row.
         loadxl.load_all(testapp, args.inpath, args.attach, args.test_only)
+    else:
+        # Users without the batch_import permission load a request per row.
+        batch_size = 100 if loadxl.can_batch_import(testapp) else None
+        if batch_size is None:
+            logger.warning(
+                '%s may not use /batch_import, loading a row per request', args.username)
+        if args.processes:
+            loadxl.load_all_parallel(
+                args.url, args.inpath, args.attach, args.test_only, args.app_name,
+                args.username, args.processes, batch_size, registry=testapp.app.registry)
+        else:
+            loadxl.load_all(
+                testapp, args.inpath, args.attach, args.test_only, batch_size=batch_size)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,75 @@
+""" Process wide cache of server rendered HTML pages.
+
+Anonymous page renders are keyed by (url, hash of the JSON body, principals,
+Accept). The JSON body and url are everything the renderer sees, so an entry
+is reused only for an identical page and never needs invalidating. Only the
+rendered body and its content headers are cached, other headers come from
+the current response. Entries are evicted least recently used first. Enable
+by setting ``clincoded.html_cache.capacity``.
+"""
+from contentbase.stats import stats_incr
+from pyramid.response import Response
+from sqlalchemy.util import LRUCache
+import hashlib
+
+HTML_CACHE = 'html_cache'
+
+CONTENT_HEADERS = {
+    'content-encoding',
+    'content-language',
+    'content-length',
+    'content-type',
+}
+
+
+def includeme(config):
+    settings = config.registry.settings
+    capacity = int(settings.get('clincoded.html_cache.capacity', 0))
+    if not capacity:
+        return
+    config.registry[HTML_CACHE] = LRUCache(capacity)
+
+
+def html_cache_key(request, response):
+    # Only anonymous pages, logged in pages render the user's session.
+    if request.authenticated_userid is not None:
+        return None
+    return (
+        request.url,
+        hashlib.sha1(response.body).hexdigest(),
+        tuple(sorted(request.effective_principals)),
+        request.headers.get('Accept', ''),
+    )
+
+
+def cached_render(request, response, render):
+    """ Return ``render(request, response)``, from the cache when possible.
+    """
+    cache = request.registry.get(HTML_CACHE)
+    if cache is None or response.status_int != 200:
+        return render(request, response)
+
+    key = html_cache_key(request, response)
+    if key is None:
+        return render(request, response)
+
+    cached = cache.get(key)
+    if cached is not None:
+        stats_incr('html_cache_hits')
+        status, content_headers, body = cached
+        headerlist = [
+            (name, value) for name, value in response.headerlist
+            if name.lower() not in CONTENT_HEADERS
+        ]
+        headerlist.extend(content_headers)
+        return Response(status=status, headerlist=headerlist, body=body)
+
+    stats_incr('html_cache_misses')
+    result = render(request, response)
+    if result.status_int == 200 and 'Set-Cookie' not in result.headers:
+        content_headers = tuple(
+            (name, value) for name, value in result.headerlist
+            if name.lower() in CONTENT_HEADERS and name.lower() != 'content-length'
+        )
+        cache[key] = (result.status, content_headers, result.body)
+    return result
@@ -3,6 +3,7 @@ from .typedsheets import cast_row_values
 from functools import reduce
 import logging
 import os.path
+import time
 
 text = type(u'')
 
@@ -45,6 +46,9 @@ ORDER = [
     'curator_page', # keep at bottom so it can load other type data
 ]
 
+# Types loaded only once everything before them in ORDER has loaded
+LOAD_LAST = ['curator_page']
+
 ##############################################################################
 # Pipeline components
 #
@@ -302,6 +306,62 @@ def make_request(testapp, item_type, method):
     return component
 
 
+class BatchImportResult(object):
+    """ The part of a webtest response the pipeline logger uses.
+    """
+    def __init__(self, result):
+        self.json = result
+        self.status_int = result['status']
+        self.status = str(self.status_int)
+        self.location = result.get('@id')
+
+
+def make_batch_request(testapp, item_type, method, batch_size=100):
+    """ Send rows to /batch_import batch_size at a time.
+
+    Imports in a single transaction per batch, avoiding the request and
+    commit overhead of a request per row.
+    """
+    def send(batch):
+        items = [[row['_url'], row['_value']] for row in batch]
+        res = testapp.post_json('/batch_import', {
+            'item_type': item_type,
+            'method': method,
+            'items': items,
+        }, status='*')
+        if res.status_int != 200:
+            for row in batch:
+                row['_errors'] = '%s importing batch' % res.status
+            return
+        for row, result in zip(batch, res.json['results']):
+            row['_response'] = BatchImportResult(result)
+
+    def component(rows):
+        batch = []
+        for row in rows:
+            if row.get('_skip') or row.get('_errors') or not row.get('_url'):
+                continue
+
+            # Keys with leading underscores are for communicating between
+            # sections
+            row['_value'] = {
+                k: v for k, v in row.items() if not k.startswith('_') and not k.startswith('@')
+            }
+            batch.append(row)
+            if len(batch) >= batch_size:
+                send(batch)
+                for row in batch:
+                    yield row
+                batch = []
+
+        if batch:
+            send(batch)
+            for row in batch:
+                yield row
+
+    return component
+
+
 ##############################################################################
 # Logging
 
@@ -452,7 +512,8 @@ def process(rows):
         pass
 
 
-def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None):
+def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None,
+                 batch_size=None):
     pipeline = [
         skip_rows_with_all_key_value(test='skip'),
         skip_rows_with_all_key_value(_test='skip'),
@@ -483,6 +544,8 @@ def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None
     pipeline.extend([
         request_url(item_type, method),
         remove_keys('uuid') if method in ('PUT', 'PATCH') else noop,
+        make_batch_request(testapp, item_type, method, batch_size)
+        if batch_size and method in ('POST', 'PUT') else
         make_request(testapp, item_type, method),
         pipeline_logger(item_type, phase),
     ])
@@ -557,13 +620,28 @@ PHASE2_PIPELINES = {
 }
 
 
-def load_all(testapp, filename, docsdir, test=False):
+def can_batch_import(testapp):
+    """ Whether the app's user has the admin only batch_import permission.
+
+    An empty batch is rejected as invalid once the permission check passes.
+    """
+    res = testapp.post_json('/batch_import', {}, status=[400, 403])
+    return res.status_int == 400
+
+
+def load_all(testapp, filename, docsdir, test=False, batch_size=None):
+    """ Load a workbook a row per request, or through /batch_import with batch_size.
+
+    /batch_import requires the admin only batch_import permission so batches
+    are only sent when asked for.
+    """
     for item_type in ORDER:
         try:
             source = read_single_sheet(filename, item_type)
         except ValueError:
             continue
-        pipeline = get_pipeline(testapp, docsdir, test, item_type, phase=1)
+        pipeline = get_pipeline(
+            testapp, docsdir, test, item_type, phase=1, batch_size=batch_size)
         process(combine(source, pipeline))
 
     for item_type in ORDER:
@@ -573,5 +651,108 @@ def load_all(testapp, filename, docsdir, test=False):
             source = read_single_sheet(filename, item_type)
         except ValueError:
             continue
-        pipeline = get_pipeline(testapp, docsdir, test, item_type, phase=2)
+        pipeline = get_pipeline(
+            testapp, docsdir, test, item_type, phase=2, batch_size=batch_size)
         process(combine(source, pipeline))
+
+
+##############################################################################
+# Parallel loading
+#
+# Types are loaded concurrently once every type they link to has loaded.
+# Links to types later in ORDER are ignored as they could not be satisfied
+# by the serial loader either, this also keeps the graph acyclic.
+
+
+def load_order_graph(dependencies):
+    """ Map each type in ORDER to the earlier types it must wait for.
+    """
+    graph = {}
+    for index, item_type in enumerate(ORDER):
+        earlier = ORDER[:index]
+        if item_type in LOAD_LAST:
+            graph[item_type] = set(earlier)
+        else:
+            graph[item_type] = set(dependencies.get(item_type, ())).intersection(earlier)
+    return graph
+
+
+# Running in subprocess
+_testapp = None
+
+
+def _initializer(*args):
+    from .commands.import_data import internal_app
+    global _testapp
+    _testapp = internal_app(*args)
+
+
+def _load_type(filename, docsdir, test, item_type, phase, batch_size):
+    begin = time.time()
+    try:
+        source = read_single_sheet(filename, item_type)
+    except ValueError:
+        return item_type, 0
+    pipeline = get_pipeline(
+        _testapp, docsdir, test, item_type, phase=phase, batch_size=batch_size)
+    process(combine(source, pipeline))
+    return item_type, time.time() - begin
+
+
+def load_all_parallel(config_uri, filename, docsdir, test=False, app_name=None,
+                      username='', processes=None, batch_size=100, registry=None):
+    """ Load a workbook as load_all, with independent types in parallel.
+
+    Pass the ``registry`` of an already loaded app to avoid loading it again
+    in this process. Returns the time spent loading each type in each phase.
+    """
+    # multiprocessing.get_context is Python 3 only.
+    from multiprocessing import get_context
+    from multiprocessing.pool import Pool
+    from contentbase import TYPES
+    from contentbase.schema_graph import dependencies
+    from queue import Queue
+    from .commands.import_data import internal_app
+
+    if registry is None:
+        registry = internal_app(config_uri, app_name, username).app.registry
+    graph = load_order_graph(dependencies(registry[TYPES].types))
+
+    pool = Pool(
+        processes=processes,
+        initializer=_initializer,
+        initargs=(config_uri, app_name, username),
+        context=get_context('forkserver'),
+    )
+    timings = {}
+    try:
+        finished = Queue()
+        pending = dict(graph)
+        done = set()
+        running = 0
+        while pending or running:
+            ready = [item_type for item_type in ORDER
+                     if item_type in pending and pending[item_type] <= done]
+            for item_type in ready:
+                del pending[item_type]
+                running += 1
+                pool.apply_async(
+                    _load_type, (filename, docsdir, test, item_type, 1, batch_size),
+                    callback=finished.put, error_callback=finished.put)
+            result = finished.get()
+            running -= 1
+            if isinstance(result, Exception):
+                raise result
+            item_type, duration = result
+            done.add(item_type)
+            timings[(item_type, 1)] = duration
+
+        # Phase 2 only updates items loaded in phase 1 so may run all at once.
+        phase2 = [item_type for item_type in ORDER if item_type in PHASE2_PIPELINES]
+        args = [(filename, docsdir, test, item_type, 2, batch_size) for item_type in phase2]
+        for item_type, duration in pool.starmap(_load_type, args, chunksize=1):
+            timings[(item_type, 2)] = duration
+    finally:
+        pool.terminate()
+        pool.join()
+    return timings
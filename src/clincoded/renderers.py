@@ -11,6 +11,8 @@ from pyramid.httpexceptions import (
 )
 from pyramid.security import forget
 from pyramid.settings import asbool
+from pyramid.request import Request
+from pyramid.response import Response
 from pyramid.threadlocal import (
     manager,
 )
@@ -19,11 +21,17 @@ from pyramid.traversal import (
     _join_path_tuple,
 )
 
+from contentbase.stats import stats_incr
 from contentbase.validation import CSRFTokenError
-from subprocess_middleware.tween import SubprocessTween
+from subprocess_middleware.tween import TransformErrorResponse
+from subprocess_middleware.worker import TransformWorker
+from .html_cache import cached_render
+import humanfriendly
 import logging
 import os
 import psutil
+import queue
+import threading
 import time
 
 
@@ -37,7 +45,11 @@ def includeme(config):
     config.add_tween(
         '.renderers.normalize_cookie_tween_factory',
         under='.renderers.fix_request_method_tween_factory')
-    config.add_tween('.renderers.page_or_json', under='.renderers.normalize_cookie_tween_factory')
+    settings = config.registry.settings
+    # The indexer and its workers only serve JSON.
+    if not (asbool(settings.get('indexer')) or asbool(settings.get('indexer_worker'))):
+        config.add_tween(
+            '.renderers.page_or_json', under='.renderers.normalize_cookie_tween_factory')
     config.add_tween('.renderers.security_tween_factory', under='pyramid_tm.tm_tween_factory')
     config.scan(__name__)
 
@@ -237,16 +249,175 @@ def after_transform(request, response):
 rss_limit = 256 * (1024 ** 2)  # MB
 
 
-def reload_process(process):
-    return psutil.Process(process.pid).memory_info().rss > rss_limit
+class WorkerScope(object):
+    """ Holds the process of a RendererWorker in place of a thread local.
+    """
+
+
+class RendererWorker(TransformWorker):
+    """ A node renderer process used by one request thread at a time.
+
+    TransformWorker keeps a process per thread. Here the process belongs to
+    the worker so the pool can start it ahead of time, measure it and kill it.
+    """
+    def __init__(self, args, env, reload_process=False):
+        super(RendererWorker, self).__init__(
+            args, reload_process=reload_process, Response=Response, env=env)
+        self.scope = WorkerScope()
+        self.renders = 0
+
+    @property
+    def process(self):
+        return getattr(self.scope, 'process', None)
+
+    def render(self, request, response):
+        try:
+            response = self(response)
+        except ValueError as e:
+            return TransformErrorResponse(e.args[0])
+        self.renders += 1
+        return response
+
+    def warm(self):
+        """ Start the process and load the renderer by rendering an empty page.
+        """
+        request = Request.blank('/')
+        response = Response(body=b'{}', content_type='application/json', charset='utf-8')
+        try:
+            self.render(request, response)
+        except Exception:
+            log.warning('Error starting renderer', exc_info=True)
+
+    def rss(self):
+        process = self.process
+        if process is None:
+            return 0
+        try:
+            return psutil.Process(process.pid).memory_info().rss
+        except psutil.NoSuchProcess:
+            return 0
+
+    def close(self):
+        process = self.process
+        if process is not None:
+            self.clear_process(process)
+
+
+class RendererPool(object):
+    """ A fixed number of renderer processes shared by the request threads.
+
+    Nothing is started until the first page is rendered, so apps only
+    serving JSON never start a renderer. Requests wait for an idle worker.
+    Workers using more than ``rss_limit`` or whose process has exited are
+    handed to a background thread which replaces them with a freshly started
+    one. Should no worker become idle within ``timeout`` the request renders
+    with a temporary worker that is closed afterwards.
+    """
+    def __init__(self, size, rss_limit, timeout, args, env, reload_process=False):
+        self.rss_limit = rss_limit
+        self.timeout = timeout
+        self.args = args
+        self.env = env
+        self.reload_process = reload_process
+        self.workers = set()
+        self.idle = queue.Queue()
+        self.retired = queue.Queue()
+        for i in range(size):
+            self.retired.put(None)
+        self.started = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            thread = threading.Thread(target=self.recycle, name='renderer-recycle')
+            thread.daemon = True
+            thread.start()
+            self.started = True
+
+    def new_worker(self):
+        return RendererWorker(self.args, self.env, self.reload_process)
+
+    def recycle(self):
+        while True:
+            worker = self.retired.get()
+            if worker is not None:
+                log.info('Recycling renderer after %d renders', worker.renders)
+                self.workers.discard(worker)
+                worker.close()
+            worker = self.new_worker()
+            worker.warm()
+            self.workers.add(worker)
+            self.idle.put(worker)
+
+    def acquire(self):
+        if not self.started:
+            self.start()
+        try:
+            return self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            log.warning('No renderer available after %ss, starting a temporary one', self.timeout)
+            return self.new_worker()
+
+    def release(self, worker):
+        if worker not in self.workers:
+            worker.close()
+        elif worker.process is None or (self.rss_limit and worker.rss() > self.rss_limit):
+            self.retired.put(worker)
+        else:
+            self.idle.put(worker)
+
+    def render(self, request, response):
+        worker = self.acquire()
+        start = time.time()
+        stats_incr('render_queue_time', int((start - request._transform_start) * 1e6))
+        request._transform_start = start
+        try:
+            return worker.render(request, response)
+        finally:
+            self.release(worker)
+
+
+class RendererPoolTween(object):
+    def __init__(self, should_transform, after_transform, args, env):
+        self.should_transform = should_transform
+        self.after_transform = after_transform
+        self.args = args
+        self.env = env
+
+    def __call__(self, handler, registry):
+        settings = registry.settings
+        pool = RendererPool(
+            # One renderer per request thread, apache runs the app with threads=1.
+            size=int(settings.get('clincoded.renderer.pool_size', 1)),
+            rss_limit=humanfriendly.parse_size(
+                settings.get('clincoded.renderer.rss_limit', str(rss_limit))),
+            timeout=float(settings.get('clincoded.renderer.queue_timeout', 60)),
+            args=self.args,
+            env=self.env,
+            # Restart the renderer after each page to pick up rebuilt javascript.
+            reload_process=asbool(settings.get('pyramid.reload_templates', False)),
+        )
+
+        def page_or_json(request):
+            response = handler(request)
+            if not self.should_transform(request, response):
+                return response
+
+            response = cached_render(request, response, pool.render)
+            self.after_transform(request, response)
+            return response
+
+        return page_or_json
+
 
 node_env = os.environ.copy()
 node_env['NODE_PATH'] = ''
 
-page_or_json = SubprocessTween(
+page_or_json = RendererPoolTween(
     should_transform=should_transform,
     after_transform=after_transform,
-    reload_process=reload_process,
     args=['node', resource_filename(__name__, 'static/build/renderer.js')],
     env=node_env,
 )
@@ -54,6 +54,9 @@ class ClinGenCurationRoot(Root):
         acl = acl_from_settings(self.registry.settings) + [
             (Allow, Everyone, ['list', 'search']),
             (Allow, 'group.submitter', ['search_audit', 'audit']),
+            # Only admins may import many items in one request.
+            (Allow, 'group.admin', 'batch_import'),
+            (Deny, Everyone, 'batch_import'),
             (Allow, Authenticated, ALL_PERMISSIONS),
             (Allow, 'group.admin', ALL_PERMISSIONS),
             (Allow, 'group.forms', ('forms',)),
@@ -1,21 +1,51 @@
+import base64
+import json
 import re
+from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from contentbase import (
     Collection,
     TYPES,
     collection_view_listing_db,
 )
+from contentbase.cache import DependencyLRUCache
 from contentbase.elasticsearch import ELASTIC_SEARCH
+from contentbase.embedding import make_subrequest
+from contentbase.json_renderer import json_stream
+from contentbase.stats import stats_incr
+from elasticsearch.exceptions import NotFoundError
 from pyramid.security import effective_principals
 from urllib.parse import urlencode
 from collections import OrderedDict
+from copy import deepcopy
 
 
 def includeme(config):
     config.add_route('search', '/search{slash:/?}')
+    config.add_request_method(indexing_generation, '_indexing_generation', reify=True)
     config.scan(__name__)
+    settings = config.registry.settings
+    capacity = int(settings.get('clincoded.facet_cache.capacity', 0))
+    if capacity:
+        config.registry[FACET_CACHE] = DependencyLRUCache(capacity)
+    capacity = int(settings.get('clincoded.search_cache.capacity', 0))
+    if capacity:
+        config.registry[SEARCH_CACHE] = DependencyLRUCache(capacity)
 
 
+FACET_CACHE = 'facet_cache'
+SEARCH_CACHE = 'search_cache'
+
+# Aggregation name shared by the facets which are not selected
+UNSELECTED_FACETS = '_unselected'
+
+# Page size when no limit is given, larger pages are not cached
+DEFAULT_LIMIT = 25
+
+# Page size and keep alive used when streaming limit=all results with scroll
+SCROLL_SIZE = 1000
+SCROLL_TIMEOUT = '1m'
+
 sanitize_search_string_re = re.compile(r'[\\\+\-\&\|\!\(\)\{\}\[\]\^\~\:\/\\\*\?]')
 
 hgConnect = ''.join([
@@ -75,6 +105,54 @@ def get_sort_order():
     }
 
 
+def encode_cursor(data):
+    """
+    Returns an opaque token for the next page of results
+    """
+    token = base64.urlsafe_b64encode(json.dumps(data, sort_keys=True).encode('utf-8'))
+    return token.decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        token = token.encode('ascii')
+        token += b'=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(token).decode('utf-8'))
+    except (ValueError, TypeError):
+        raise HTTPBadRequest('Invalid cursor')
+    if not isinstance(data, dict):
+        raise HTTPBadRequest('Invalid cursor')
+    return data
+
+
+def cursor_filter(after):
+    """
+    Returns a filter for the results sorted after the last result of a page
+
+    Elasticsearch 1.x has no search_after so the sort order of
+    get_sort_order() followed by uuid is continued with range filters.
+    embedded.date_created is an analyzed string, its sort value is the
+    lowercased date which is compared against the indexed term as is.
+    """
+    if not isinstance(after, list) or len(after) != 2:
+        raise HTTPBadRequest('Invalid cursor')
+    date_created, uuid = after
+    if not isinstance(uuid, str) or not isinstance(date_created, (str, type(None))):
+        raise HTTPBadRequest('Invalid cursor')
+    after_uuid = {'range': {'uuid': {'lt': uuid}}}
+    missing = {'missing': {'field': 'embedded.date_created'}}
+    # Documents without a date sort last, reported with a null sort value.
+    if date_created is None:
+        return {'and': [missing, after_uuid]}
+    return {
+        'or': [
+            {'range': {'embedded.date_created': {'lt': date_created}}},
+            {'and': [{'term': {'embedded.date_created': date_created}}, after_uuid]},
+            missing,
+        ],
+    }
+
+
 def get_search_fields(request, doc_types):
     """
     Returns set of columns that are being searched and highlights
@@ -127,13 +205,13 @@ def set_filters(request, query, result):
     used_filters = {}
     for field, term in request.params.items():
         if field in ['type', 'limit', 'mode', 'searchTerm',
-                     'format', 'frame', 'datastore', 'field']:
+                     'format', 'frame', 'datastore', 'field', 'cursor']:
             continue
 
         # Add filter to result
         qs = urlencode([
             (k.encode('utf-8'), v.encode('utf-8'))
-            for k, v in request.params.items() if v != term
+            for k, v in request.params.items() if v != term and k != 'cursor'
         ])
         result['filters'].append({
             'field': field,
@@ -198,10 +276,53 @@ def set_filters(request, query, result):
     return used_filters
 
 
+def filter_for(field, terms):
+    """
+    Returns the elasticsearch filter for a used filter
+    """
+    if field.endswith('!'):
+        return {'not': {'terms': {'embedded.' + field[:-1] + '.raw': terms}}}
+    elif field.startswith('audit'):
+        return {'terms': {field: terms}}
+    return {'terms': {'embedded.' + field + '.raw': terms}}
+
+
+def and_filter(filters):
+    if not filters:
+        return {'match_all': {}}
+    return {'and': {'filters': filters}}
+
+
 def set_facets(facets, used_filters, query, principals):
     """
     Sets facets in the query using filters
+
+    Filters on fields which are not a selected facet, including the
+    principals filter, apply to the results and every facet alike so they
+    are moved into a filtered query evaluated once. Selected facets stay in
+    the post filter so that each may be aggregated without its own filter.
+    Unselected facets share a single filter aggregation.
     """
+    selected = [field for field, _ in facets if field in used_filters]
+    base_filters = [{'terms': {'principals_allowed.view': principals}}]
+    base_filters.extend(
+        filter_for(field, terms) for field, terms in used_filters.items()
+        if field not in selected
+    )
+    query['query'] = {
+        'filtered': {
+            'query': query['query'],
+            'filter': and_filter(base_filters),
+        },
+    }
+    if selected:
+        query['filter'] = and_filter([
+            filter_for(field, used_filters[field]) for field in selected
+        ])
+    else:
+        del query['filter']
+
+    unselected = {}
     for field, _ in facets:
         if field == 'type':
             query_field = '_type'
@@ -210,49 +331,104 @@ def set_facets(facets, used_filters, query, principals):
         else:
             query_field = 'embedded.' + field + '.raw'
         agg_name = field.replace('.', '-')
-
-        terms = []
-        # Adding facets based on filters
-        for q_field, q_terms in used_filters.items():
-            if q_field != field and q_field.startswith('audit'):
-                terms.append({'terms': {q_field: q_terms}})
-            elif q_field != field and not q_field.endswith('!'):
-                terms.append({'terms': {'embedded.' + q_field + '.raw': q_terms}})
-            elif q_field != field and q_field.endswith('!'):
-                terms.append({'not': {'terms': {'embedded.' + q_field[:-1] + '.raw': q_terms}}})
-
-        terms.append(
-            {'terms': {'principals_allowed.view': principals}}
-        )
+        terms_agg = {
+            'terms': {
+                'field': query_field,
+                'min_doc_count': 0,
+                'size': 100
+            }
+        }
+        if field not in selected:
+            unselected[agg_name] = terms_agg
+            continue
         query['aggs'][agg_name] = {
             'aggs': {
-                agg_name: {
-                    'terms': {
-                        'field': query_field,
-                        'min_doc_count': 0,
-                        'size': 100
-                    }
-                }
-            },
-            'filter': {
-                'bool': {
-                    'must': terms,
-                },
+                agg_name: terms_agg,
             },
+            'filter': and_filter([
+                filter_for(other, used_filters[other]) for other in selected
+                if other != field
+            ]),
         }
 
+    if unselected:
+        query['aggs'][UNSELECTED_FACETS] = {
+            'aggs': unselected,
+            'filter': and_filter([
+                filter_for(field, used_filters[field]) for field in selected
+            ]),
+        }
 
-def load_results(request, es_results, result):
+
+def load_facets(facets, aggregations):
     """
-    Loads results to pass onto UI
+    Returns the terms and total for each facet from the aggregation results
+    """
+    unselected = aggregations.get(UNSELECTED_FACETS, {})
+    facet_results = {}
+    for field, facet in facets:
+        agg_name = field.replace('.', '-')
+        if agg_name in unselected:
+            terms = unselected[agg_name]['buckets']
+            total = unselected['doc_count']
+        elif agg_name in aggregations:
+            terms = aggregations[agg_name][agg_name]['buckets']
+            total = aggregations[agg_name]['doc_count']
+        else:
+            continue
+        facet_results[field] = {
+            'field': field,
+            'title': facet['title'],
+            'terms': terms,
+            'total': total,
+        }
+    return facet_results
+
+
+def facet_cache_key(request, doc_types, facets, principals):
+    """
+    Facets of searches without a search term or filters are cached until reindexing
+    """
+    generation = request._indexing_generation
+    if generation is None:
+        return None
+    return (
+        generation,
+        tuple(sorted(doc_types)),
+        request.params.get('mode'),
+        tuple(field for field, _ in facets),
+        tuple(sorted(principals)),
+    )
+
+
+def indexing_generation(request):
+    """
+    Returns the generation written by the last indexing pass which changed the index
+
+    Read from the searcher rather than realtime so that it is not newer than
+    the search results.
+    """
+    es = request.registry[ELASTIC_SEARCH]
+    es_index = request.registry.settings['contentbase.elasticsearch.index']
+    try:
+        status = es.get(index=es_index, doc_type='meta', id='generation', realtime=False)
+    except NotFoundError:
+        return None
+    return (status['_source']['xmin'], status['_source']['timestamp'])
+
+
+def format_results(request, hits):
+    """
+    Yields result items from elasticsearch hits
     """
-    hits = es_results['hits']['hits']
     frame = request.params.get('frame')
     fields_requested = request.params.getall('field')
     if frame in ['embedded', 'object'] and not len(fields_requested):
-        result['@graph'] = [hit['_source'][frame] for hit in hits]
+        for hit in hits:
+            yield hit['_source'][frame]
     elif fields_requested:
-        result['@graph'] = [hit['_source']['embedded'] for hit in hits]
+        for hit in hits:
+            yield hit['_source']['embedded']
     else:  # columns
         for hit in hits:
             item_type = hit['_type']
@@ -266,14 +442,118 @@ def load_results(request, es_results, result):
                 item['highlight'] = {}
                 for key in hit['highlight']:
                     item['highlight'][key[9:]] = list(set(hit['highlight'][key]))
-            result['@graph'].append(item)
+            yield item
+
+
+def load_results(request, es_results, result):
+    """
+    Loads results to pass onto UI
+    """
+    result['@graph'].extend(format_results(request, es_results['hits']['hits']))
+
+
+def scroll_hits(es, es_results):
+    """
+    Yields hits from a scrolled search, fetching further pages as needed
+    """
+    scroll_id = es_results.get('_scroll_id')
+    hits = es_results['hits']['hits']
+    try:
+        while hits:
+            for hit in hits:
+                yield hit
+            if scroll_id is None:
+                break
+            page = es.scroll(scroll_id=scroll_id, scroll=SCROLL_TIMEOUT)
+            scroll_id = page.get('_scroll_id')
+            hits = page['hits']['hits']
+    finally:
+        if scroll_id is not None:
+            try:
+                es.clear_scroll(scroll_id=scroll_id)
+            except Exception:
+                pass
+
+
+def stream_results(request, es, es_results, result):
+    """
+    Returns a response writing the @graph while scrolling through the results
+    """
+    response = request.response
+    response.content_type = 'application/json'
+    # Normally set by the BeforeRender subscriber in renderers.py
+    response.headers['X-Request-URL'] = request.url
+    graph = format_results(request, scroll_hits(es, es_results))
+    response.app_iter = json_stream(result, '@graph', graph)
+    return response
+
+
+def iter_search_results(request, params):
+    """
+    Returns an iterator over all search results for params
+
+    Results are scrolled through page by page rather than loaded at once.
+    """
+    params = dict(params, limit=['all'])
+    subreq = make_subrequest(request, '/search/?%s' % urlencode(params, True))
+    subreq.override_renderer = 'null_renderer'
+    subreq._search_generator = True
+    result = request.invoke_subrequest(subreq)
+    return result['@graph']
+
+
+def search_cache_key(request, search_type):
+    """
+    Search results are cached per query until the next indexing run
+
+    The full query string is part of the key as links in the results include it.
+    Only pages up to the default size are cached, the cache is bounded by its
+    number of entries.
+    """
+    limit = request.params.get('limit', str(DEFAULT_LIMIT))
+    if not limit.isdigit() or int(limit) > DEFAULT_LIMIT:
+        return None
+    generation = request._indexing_generation
+    if generation is None:
+        return None
+    return (
+        generation,
+        request.path,
+        search_type,
+        tuple(sorted(request.params.items())),
+        tuple(sorted(effective_principals(request))),
+    )
 
 
 @view_config(route_name='search', request_method='GET', permission='search')
 def search(context, request, search_type=None):
     """
     Search view connects to ElasticSearch and returns the results
+
+    Results which are not streamed are served from the search cache when enabled.
     """
+    cache = request.registry.get(SEARCH_CACHE)
+    if cache is None or getattr(request, '_search_generator', False):
+        return _search(context, request, search_type)
+    key = search_cache_key(request, search_type)
+    if key is None:
+        return _search(context, request, search_type)
+
+    cached = cache.get(key)
+    if cached is not None:
+        stats_incr('search_cache_hits')
+        return deepcopy(cached[0])
+
+    stats_incr('search_cache_misses')
+    result = _search(context, request, search_type)
+    # The gdm and interpretation listings return everything without a limit.
+    if isinstance(result, dict) and isinstance(result.get('@graph'), list) and \
+            len(result['@graph']) <= DEFAULT_LIMIT:
+        cache.set(key, deepcopy(result))
+    return result
+
+
+def _search(context, request, search_type=None):
     root = request.root
     types = request.registry[TYPES]
     result = {
@@ -293,14 +573,20 @@ def search(context, request, search_type=None):
     search_audit = request.has_permission('search_audit')
 
     # handling limit
-    size = request.params.get('limit', 25)
+    size = request.params.get('limit', DEFAULT_LIMIT)
+    stream = False
     if size in ('all', ''):
         size = 99999
+        stream = True
     else:
         try:
             size = int(size)
         except ValueError:
-            size = 25
+            size = DEFAULT_LIMIT
+
+    cursor = request.params.get('cursor')
+    if cursor is not None:
+        cursor = decode_cursor(cursor)
 
     search_term = request.params.get('searchTerm', '*')
     if search_term != '*':
@@ -340,7 +626,8 @@ def search(context, request, search_type=None):
         for item_type in doc_types:
             qs = urlencode([
                 (k.encode('utf-8'), v.encode('utf-8'))
-                for k, v in request.params.items() if k != 'type' and v != item_type
+                for k, v in request.params.items()
+                if k not in ('type', 'cursor') and v != item_type
             ])
             result['filters'].append({
                 'field': 'type',
@@ -361,7 +648,7 @@ def search(context, request, search_type=None):
 
     # Sorting the files when search term is not specified
     if search_term == '*':
-        query['sort'] = get_sort_order()
+        query['sort'] = [get_sort_order(), {'uuid': {'order': 'desc'}}]
         query['query']['match_all'] = {}
         del query['query']['query_string']
     elif len(doc_types) != 1:
@@ -387,36 +674,72 @@ def search(context, request, search_type=None):
         for audit_facet in audit_facets:
             facets.append(audit_facet)
 
-    set_facets(facets, used_filters, query, principals)
+    facet_cache = request.registry.get(FACET_CACHE)
+    cache_key = None
+    cached_facets = None
+    if facet_cache is not None and not used_filters and search_term == '*':
+        cache_key = facet_cache_key(request, doc_types, facets, principals)
+        if cache_key is not None:
+            cached = facet_cache.get(cache_key)
+            if cached is not None:
+                cached_facets = cached[0]
+
+    if cached_facets is None:
+        set_facets(facets, used_filters, query, principals)
+    else:
+        set_facets([], used_filters, query, principals)
 
-    if doc_types == ['gdm'] or doc_types == ['interpretation']:
+    # Everything unless the client pages through the results
+    if (doc_types == ['gdm'] or doc_types == ['interpretation']) and \
+            'limit' not in request.params and cursor is None:
         size = 99999
+        stream = True
+
+    # Unbounded results are streamed to the client, except when the caller
+    # needs the result dict (subrequests and collection listings).
+    # iter_search_results asks for a result dict with a lazy @graph instead.
+    generator = getattr(request, '_search_generator', False)
+    stream = stream and search_type is None and (request.__parent__ is None or generator)
+
+    # Continue from the page before
+    offset = 0
+    if cursor is not None and not stream:
+        if 'after' in cursor:
+            if 'sort' not in query:
+                raise HTTPBadRequest('Invalid cursor')
+            post_filters = [cursor_filter(cursor['after'])]
+            if 'filter' in query:
+                post_filters.append(query['filter'])
+            query['filter'] = and_filter(post_filters)
+        else:
+            try:
+                offset = int(cursor.get('from', 0))
+            except (TypeError, ValueError):
+                raise HTTPBadRequest('Invalid cursor')
 
     # Execute the query
-    es_results = es.search(body=query, index=es_index,
-                           doc_type=doc_types or None, size=size)
+    if stream:
+        es_results = es.search(body=query, index=es_index, doc_type=doc_types or None,
+                               size=SCROLL_SIZE, scroll=SCROLL_TIMEOUT)
+    else:
+        es_results = es.search(body=query, index=es_index,
+                               doc_type=doc_types or None, size=size, from_=offset)
 
     # Loading facets in to the results
-    if 'aggregations' in es_results:
-        facet_results = es_results['aggregations']
-        for field, facet in facets:
-            agg_name = field.replace('.', '-')
-            if agg_name not in facet_results:
-                continue
-            terms = facet_results[agg_name][agg_name]['buckets']
-            if len(terms) < 2:
-                continue
-            result['facets'].append({
-                'field': field,
-                'title': facet['title'],
-                'terms': terms,
-                'total': facet_results[agg_name]['doc_count']
-            })
+    if cached_facets is not None:
+        facet_results = cached_facets
+    else:
+        facet_results = load_facets(facets, es_results.get('aggregations', {}))
+        if cache_key is not None:
+            facet_cache.set(cache_key, facet_results)
+    for field, facet in facets:
+        if field in facet_results and len(facet_results[field]['terms']) >= 2:
+            result['facets'].append(facet_results[field])
 
     # generate batch hub URL for experiments
     if doc_types == ['experiment'] and any(
-            facet['doc_count'] > 0
-            for facet in es_results['aggregations']['assembly']['assembly']['buckets']):
+            term['doc_count'] > 0
+            for term in facet_results.get('assembly', {}).get('terms', ())):
         search_params = request.query_string.replace('&', ',,')
         hub = request.route_url('batch_hub',
                                 search_params=search_params,
@@ -430,12 +753,29 @@ def search(context, request, search_type=None):
             search_params=request.query_string
         )
 
-    # Moved to a seperate method to make code readable
-    load_results(request, es_results, result)
-
     # Adding total
     result['total'] = es_results['hits']['total']
+    if cursor is not None and 'after' in cursor:
+        # The cursor filter leaves only the remaining results in the hits total.
+        result['total'] = cursor.get('total', result['total'])
     result['notification'] = 'Success' if result['total'] else 'No results found'
+
+    # Token for the next page
+    hits = es_results['hits']['hits']
+    if not stream and hits and len(hits) == size:
+        if 'sort' in query:
+            result['next'] = encode_cursor({'after': hits[-1]['sort'], 'total': result['total']})
+        elif offset + size < result['total']:
+            result['next'] = encode_cursor({'from': offset + size})
+
+    if stream and generator:
+        result['@graph'] = format_results(request, scroll_hits(es, es_results))
+        return result
+    elif stream:
+        return stream_results(request, es, es_results, result)
+
+    # Moved to a seperate method to make code readable
+    load_results(request, es_results, result)
     return result
 
 
@@ -179,7 +179,7 @@ def workbook(connection, app, app_settings):
         from pkg_resources import resource_filename
         inserts = resource_filename('clincoded', 'tests/data/inserts/')
         docsdir = [resource_filename('clincoded', 'tests/data/documents/')]
-        load_all(testapp, inserts, docsdir)
+        load_all(testapp, inserts, docsdir, batch_size=100)
 
         yield
     finally:
@@ -81,6 +81,59 @@ def test_audit_conditions(auditor_conditions, dummy_request):
     assert error['path'] == '/foo/'
 
 
+def test_audit_frame_fetched_once(dummy_request):
+    from contentbase.auditor import Auditor
+    auditor = Auditor()
+    auditor.add_audit_checker(raising_checker, 'test')
+    auditor.add_audit_checker(returning_checker, 'test')
+    fetched = []
+    dummy_request._embed['/foo/@@embedded'] = {}
+    dummy_request.embed = lambda path: fetched.append(path) or dummy_request._embed[path]
+    errors = auditor.audit(request=dummy_request, path='/foo/', types='test')
+    assert len(errors) == 2
+    assert fetched == ['/foo/@@embedded']
+
+
+def test_audit_cache(dummy_request):
+    from contentbase.auditor import Auditor
+
+    class Item(object):
+        def __init__(self, tid):
+            self.tid = tid
+
+    items = {'foo': Item(1)}
+
+    class Root(object):
+        def get_by_uuid(self, uuid):
+            return items.get(uuid)
+
+    calls = []
+
+    def counting_checker(value, system):
+        calls.append(value)
+        return raising_checker(value, system)
+
+    def embed(path):
+        dummy_request._embedded_uuids.add('foo')
+        return dummy_request._embed[path]
+
+    auditor = Auditor(cache_capacity=10)
+    auditor.add_audit_checker(counting_checker, 'test')
+    dummy_request._embedded_uuids = set()
+    dummy_request._linked_uuids = set()
+    dummy_request._embed['/foo/@@embedded'] = {}
+    dummy_request.embed = embed
+    first = auditor.audit(request=dummy_request, path='/foo/', types='test', root=Root())
+    second = auditor.audit(request=dummy_request, path='/foo/', types='test', root=Root())
+    assert first == second
+    assert len(calls) == 1
+    assert dummy_request._embedded_uuids == {'foo'}
+
+    items['foo'] = Item(2)
+    auditor.audit(request=dummy_request, path='/foo/', types='test', root=Root())
+    assert len(calls) == 2
+
+
 def test_declarative_config(dummy_request):
     from pyramid.config import Configurator
     config = Configurator()
@@ -126,3 +179,39 @@ def test_link_target_audit_pass(testapp):
         errors_list.extend(errors_dict[error_type])
     errors = [e for e in errors_list if e['name'] == 'testing_link_target_status']
     assert errors == []
+
+
+def test_audit_cache_records_checker_uuids(dummy_request):
+    from contentbase.auditor import Auditor
+
+    class Item(object):
+        tid = 1
+
+    class Root(object):
+        def get_by_uuid(self, uuid):
+            return Item()
+
+    calls = []
+
+    def looking_up_checker(value, system):
+        calls.append(value)
+        request = system['request']
+        request.embed('/bar/')
+        request._linked_uuids.add('baz')
+
+    def embed(path):
+        dummy_request._embedded_uuids.add(path.strip('/').split('/')[0])
+        return {}
+
+    auditor = Auditor(cache_capacity=10)
+    auditor.add_audit_checker(looking_up_checker, 'test')
+    dummy_request.embed = embed
+    recorded = []
+    for i in range(2):
+        dummy_request._embedded_uuids = set()
+        dummy_request._linked_uuids = set()
+        auditor.audit(request=dummy_request, path='/foo/', types='test', root=Root())
+        recorded.append((dummy_request._embedded_uuids, dummy_request._linked_uuids))
+    assert len(calls) == 1
+    assert recorded[0] == ({'foo', 'bar'}, {'baz'})
+    assert recorded[1] == recorded[0]
@@ -0,0 +1,71 @@
+import pytest
+
+
+@pytest.yield_fixture
+def principals_cache(registry):
+    from contentbase.cache import DependencyLRUCache
+    from contentbase.invalidation import (
+        TRANSACTION_LISTENER,
+        Invalidated,
+        TransactionListener,
+    )
+    from ..authorization import (
+        PRINCIPALS_CACHE,
+        invalidate_principals_cache,
+    )
+    cache = registry[PRINCIPALS_CACHE] = DependencyLRUCache(10)
+    # Committed transactions are only reported when a listener is configured.
+    registry[TRANSACTION_LISTENER] = TransactionListener()
+    registry.registerHandler(invalidate_principals_cache, (Invalidated,))
+    yield cache
+    registry.unregisterHandler(invalidate_principals_cache, (Invalidated,))
+    del registry[TRANSACTION_LISTENER]
+    del registry[PRINCIPALS_CACHE]
+
+
+@pytest.fixture
+def access_key(testapp, curator):
+    item = {
+        'user': curator['@id'],
+        'description': 'test key',
+    }
+    return testapp.post_json('/access-keys/', item).json
+
+
+def test_principals_cache_user_disabled(testapp, threadlocals, principals_cache, curator):
+    from ..authorization import groupfinder
+    login = 'remoteuser.' + curator['email']
+    assert 'userid.' + curator['uuid'] in groupfinder(login, threadlocals)
+    assert login in principals_cache
+    testapp.patch_json(curator['@id'], {'status': 'disabled'})
+    assert login not in principals_cache
+    assert groupfinder(login, threadlocals) is None
+
+
+def test_principals_cache_user_groups(testapp, threadlocals, principals_cache, curator):
+    from ..authorization import groupfinder
+    login = 'remoteuser.' + curator['email']
+    assert 'group.admin' not in groupfinder(login, threadlocals)
+    testapp.patch_json(curator['@id'], {'groups': ['admin']})
+    assert login not in principals_cache
+    assert 'group.admin' in groupfinder(login, threadlocals)
+
+
+@pytest.mark.parametrize('status', ['deleted', 'disabled'])
+def test_principals_cache_access_key_status(
+        testapp, threadlocals, principals_cache, access_key, curator, status):
+    from ..authorization import groupfinder
+    login = 'accesskey.' + access_key['access_key_id']
+    assert 'userid.' + curator['uuid'] in groupfinder(login, threadlocals)
+    assert login in principals_cache
+    testapp.patch_json(access_key['@graph'][0]['@id'], {'status': status})
+    assert login not in principals_cache
+    assert groupfinder(login, threadlocals) is None
+
+
+def test_principals_cache_skips_uncommitted_writes(threadlocals, principals_cache, curator):
+    from ..authorization import groupfinder
+    login = 'remoteuser.' + curator['email']
+    threadlocals._updated_uuid_paths[curator['uuid']]
+    assert 'userid.' + curator['uuid'] in groupfinder(login, threadlocals)
+    assert login not in principals_cache
@@ -8,3 +8,50 @@ def test_graph_svg(testapp):
     res = testapp.get('/profiles/graph.svg', status=200)
     assert res.content_type == 'image/svg+xml'
     assert res.text
+
+
+def test_load_order_graph(registry):
+    from contentbase import TYPES
+    from contentbase.schema_graph import dependencies
+    from ..loadxl import (
+        ORDER,
+        load_order_graph,
+    )
+    graph = load_order_graph(dependencies(registry[TYPES].types))
+    assert set(graph) == set(ORDER)
+    assert graph['user'] == set()
+    assert 'disease' in graph['gdm']
+    assert graph['curator_page'] == set(ORDER[:-1])
+    for item_type, deps in graph.items():
+        assert all(ORDER.index(dep) < ORDER.index(item_type) for dep in deps)
+
+
+def test_dependencies_nested_links():
+    from contentbase.schema_graph import dependencies
+
+    class TypeInfo(object):
+        def __init__(self, name, schema=None):
+            self.base_types = [name, 'Item']
+            self.schema = schema
+
+    schema = {
+        'properties': {
+            'direct': {'linkTo': 'a'},
+            'array': {'items': {'linkTo': 'b'}},
+            'nested': {
+                'type': 'object',
+                'properties': {
+                    'inner': {'items': {'type': 'object', 'properties': {'deep': {'linkTo': 'c'}}}},
+                },
+            },
+            'calculated': {'calculatedProperty': True, 'linkTo': 'd'},
+        },
+    }
+    types = {
+        'source': TypeInfo('source', schema),
+        'a': TypeInfo('a'),
+        'b': TypeInfo('b'),
+        'c': TypeInfo('c'),
+        'd': TypeInfo('d'),
+    }
+    assert dependencies(types)['source'] == {'a', 'b', 'c'}
@@ -0,0 +1,49 @@
+class DummyRequest(object):
+    authenticated_userid = None
+    effective_principals = ['system.Everyone']
+
+    def __init__(self, registry, url='http://localhost/genes/'):
+        self.registry = registry
+        self.url = url
+        self.headers = {'Accept': 'text/html'}
+
+
+def test_html_cache_keyed_on_body():
+    from pyramid.response import Response
+    from sqlalchemy.util import LRUCache
+    from ..html_cache import (
+        HTML_CACHE,
+        cached_render,
+    )
+    registry = {HTML_CACHE: LRUCache(10)}
+    rendered = []
+
+    def render(request, response):
+        rendered.append((request.url, response.body))
+        result = Response(body=b'<html>' + response.body + b'</html>')
+        result.headers['X-Request-URL'] = response.headers['X-Request-URL']
+        return result
+
+    def page(body, url='http://localhost/genes/', stats='1'):
+        request = DummyRequest(registry, url)
+        response = Response(body=body, content_type='application/json')
+        response.headers['X-Request-URL'] = url
+        response.headers['X-Stats'] = stats
+        return cached_render(request, response, render)
+
+    assert page(b'{"a": 1}').body == b'<html>{"a": 1}</html>'
+    res = page(b'{"a": 1}', stats='2')
+    assert res.body == b'<html>{"a": 1}</html>'
+    assert res.content_type == 'text/html'
+    # Headers other than the content headers come from the current response.
+    assert res.headers['X-Stats'] == '2'
+    # A listing changed without any embedded item changing
+    assert page(b'{"a": 2}').body == b'<html>{"a": 2}</html>'
+    # Pages are not shared between hosts or schemes.
+    res = page(b'{"a": 1}', url='https://example.org/genes/')
+    assert res.headers['X-Request-URL'] == 'https://example.org/genes/'
+    assert rendered == [
+        ('http://localhost/genes/', b'{"a": 1}'),
+        ('http://localhost/genes/', b'{"a": 2}'),
+        ('https://example.org/genes/', b'{"a": 1}'),
+    ]
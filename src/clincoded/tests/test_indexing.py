@@ -49,7 +49,7 @@ def teardown(app, dbapi_conn):
     from contentbase.elasticsearch import create_mapping
     create_mapping.run(app)
     cursor = dbapi_conn.cursor()
-    cursor.execute("""TRUNCATE resources, transactions CASCADE;""")
+    cursor.execute("""TRUNCATE resources, transactions, dependencies CASCADE;""")
     cursor.close()
 
 
@@ -114,6 +114,29 @@ def test_indexing_simple(testapp, indexer_testapp):
     assert res.json['total'] == 2
 
 
+def test_indexing_dependencies(testapp, indexer_testapp):
+    testapp.post_json('/testing-post-put-patch/', {'required': ''})
+    res = indexer_testapp.post_json('/index', {'record': True})
+    assert res.json['dependencies'] is True
+
+    res = testapp.post_json('/testing-post-put-patch/', {'required': ''})
+    uuid = res.json['@graph'][0]['uuid']
+    res = indexer_testapp.post_json('/index', {'record': True})
+    assert res.json['dependencies'] is True
+    assert res.json['updated'] == [uuid]
+    assert res.json['indexed'] == 1
+
+
+def test_search_limit_all_streamed(testapp, indexer_testapp):
+    for i in range(3):
+        testapp.post_json('/testing-post-put-patch/', {'required': ''})
+    indexer_testapp.post_json('/index', {'record': True})
+    res = testapp.get('/search/?type=testing_post_put_patch&limit=all')
+    assert res.json['total'] == 3
+    assert len(res.json['@graph']) == 3
+    assert res.headers['X-Request-URL']
+
+
 def test_listening(testapp, listening_conn):
     import time
     testapp.post_json('/testing-post-put-patch/', {'required': ''})
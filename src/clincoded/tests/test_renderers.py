@@ -11,3 +11,57 @@ def test_render_error_then_success(anonhtmltestapp):
     anonhtmltestapp.get('/testing-render-error', status=500)
     res = anonhtmltestapp.get('/', status=200)
     assert res.body.startswith(b'<!DOCTYPE html>')
+
+
+ECHO_RENDERER = r'''
+import sys
+stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+while stdin.readline():
+    length = 0
+    for header in iter(stdin.readline, b'\r\n'):
+        if header.lower().startswith(b'content-length:'):
+            length = int(header.split(b':')[1])
+    body = b'<html>' + stdin.read(length) + b'</html>'
+    stdout.write(
+        b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n'
+        b'Content-Length: %d\r\n\r\n' % len(body))
+    stdout.write(body)
+    stdout.flush()
+'''
+
+
+def test_renderer_pool(tmpdir):
+    import sys
+    import time
+    from pyramid.request import Request
+    from pyramid.response import Response
+    from ..renderers import RendererPool
+    script = tmpdir.join('renderer.py')
+    script.write(ECHO_RENDERER)
+    pool = RendererPool(
+        size=1, rss_limit=0, timeout=0.1, args=[sys.executable, str(script)], env=None)
+    # Nothing is started until a page is rendered.
+    assert not pool.started
+    assert pool.idle.empty()
+    pool.start()
+    worker = pool.idle.get(timeout=10)
+    pid = worker.process.pid
+    pool.release(worker)
+
+    def render(body):
+        request = Request.blank('/')
+        request._transform_start = time.time()
+        response = Response(body=body, content_type='application/json', charset='utf-8')
+        return pool.render(request, response).body
+
+    assert render(b'{}') == b'<html>{}</html>'
+    # The warm process started by the pool serves the request threads.
+    worker = pool.idle.get(timeout=10)
+    assert worker.process.pid == pid
+
+    # With no idle worker a temporary one renders and is then closed.
+    assert render(b'[]') == b'<html>[]</html>'
+    assert pool.workers == {worker}
+    assert pool.idle.empty()
+    pool.release(worker)
+    worker.close()
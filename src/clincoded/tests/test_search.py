@@ -0,0 +1,108 @@
+def test_set_facets_shares_base_filter():
+    from clincoded.search import (
+        UNSELECTED_FACETS,
+        set_facets,
+    )
+    query = {
+        'query': {'match_all': {}},
+        'filter': {'and': {'filters': []}},
+        'aggs': {},
+    }
+    facets = [('type', {}), ('status', {}), ('gene.symbol', {})]
+    used_filters = {'status': ['released'], 'lab.title': ['Lab'], 'gene.symbol!': ['A']}
+    set_facets(facets, used_filters, query, ['system.Everyone'])
+
+    base_filters = query['query']['filtered']['filter']['and']['filters']
+    assert {'terms': {'principals_allowed.view': ['system.Everyone']}} in base_filters
+    assert {'terms': {'embedded.lab.title.raw': ['Lab']}} in base_filters
+    assert {'not': {'terms': {'embedded.gene.symbol.raw': ['A']}}} in base_filters
+    status_filter = {'terms': {'embedded.status.raw': ['released']}}
+    assert query['filter'] == {'and': {'filters': [status_filter]}}
+
+    # Only the selected facet is aggregated without its own filter
+    assert query['aggs']['status']['filter'] == {'match_all': {}}
+    unselected = query['aggs'][UNSELECTED_FACETS]
+    assert unselected['filter'] == {'and': {'filters': [status_filter]}}
+    assert set(unselected['aggs']) == {'type', 'gene-symbol'}
+
+
+def test_load_facets():
+    from clincoded.search import (
+        UNSELECTED_FACETS,
+        load_facets,
+    )
+    buckets = [{'key': 'a', 'doc_count': 1}]
+    aggregations = {
+        'status': {'doc_count': 5, 'status': {'buckets': buckets}},
+        UNSELECTED_FACETS: {'doc_count': 3, 'type': {'buckets': buckets}},
+    }
+    facets = [('type', {'title': 'Type'}), ('status', {'title': 'Status'})]
+    results = load_facets(facets, aggregations)
+    assert results['type']['total'] == 3
+    assert results['status']['total'] == 5
+    assert results['status']['terms'] == buckets
+
+
+def test_cursor_round_trip():
+    from clincoded.search import (
+        decode_cursor,
+        encode_cursor,
+    )
+    data = {'after': ['2015-01-01t12:00:00.000000+00:00', 'a-uuid'], 'total': 1000}
+    token = encode_cursor(data)
+    assert '=' not in token
+    assert decode_cursor(token) == data
+
+
+def test_invalid_cursor():
+    import pytest
+    from pyramid.httpexceptions import HTTPBadRequest
+    from clincoded.search import decode_cursor
+    with pytest.raises(HTTPBadRequest):
+        decode_cursor('not a cursor')
+
+
+def test_cursor_filter():
+    from clincoded.search import cursor_filter
+    date_created = '2015-01-01t12:00:00.000000+00:00'
+    assert cursor_filter([date_created, 'b']) == {'or': [
+        {'range': {'embedded.date_created': {'lt': date_created}}},
+        {'and': [
+            {'term': {'embedded.date_created': date_created}},
+            {'range': {'uuid': {'lt': 'b'}}},
+        ]},
+        {'missing': {'field': 'embedded.date_created'}},
+    ]}
+
+
+def test_cursor_filter_missing_date():
+    from clincoded.search import cursor_filter
+    assert cursor_filter([None, 'b']) == {'and': [
+        {'missing': {'field': 'embedded.date_created'}},
+        {'range': {'uuid': {'lt': 'b'}}},
+    ]}
+
+
+def test_invalid_cursor_filter():
+    import pytest
+    from pyramid.httpexceptions import HTTPBadRequest
+    from clincoded.search import cursor_filter
+    for after in [5, 'ab', {'a': 1}, ['a'], [1420070400000, 'b'], ['a', None]]:
+        with pytest.raises(HTTPBadRequest):
+            cursor_filter(after)
+
+
+def test_search_cache_key():
+    from pyramid.testing import DummyRequest
+    from webob.multidict import MultiDict
+    from clincoded.search import search_cache_key
+
+    def key(params):
+        request = DummyRequest(params=MultiDict(params), path='/search/')
+        request._indexing_generation = (1, '2015-01-01T00:00:00+00:00')
+        return search_cache_key(request, None)
+
+    assert key([('type', 'gdm'), ('limit', '25')]) == key([('limit', '25'), ('type', 'gdm')])
+    assert key([('type', 'gdm')]) != key([('type', 'gdm'), ('format', 'json')])
+    assert key([('type', 'gdm'), ('limit', 'all')]) is None
+    assert key([('type', 'gdm'), ('limit', '1000')]) is None
@@ -146,3 +146,18 @@ def test_keys(session):
     session.add(key3)
     with pytest.raises(FlushError):
         session.flush()
+
+
+def test_get_many_by_uuid(session):
+    from contentbase.storage import (
+        RDBStorage,
+        Resource,
+    )
+    resources = [Resource('test_item', {'': {'index': i}}) for i in range(3)]
+    session.add_all(resources)
+    session.flush()
+    storage = RDBStorage()
+    rids = [str(resource.rid) for resource in resources[:2]]
+    models = storage.get_many_by_uuid(rids)
+    assert sorted(str(model.rid) for model in models) == sorted(rids)
+    assert storage.get_many_by_uuid([]) == []
@@ -208,6 +208,52 @@ def test_post_duplicate_uuid(testapp, disease):
     testapp.post_json('/disease', item, status=409)
 
 
+def test_batch_import(testapp, disease):
+    items = [
+        ['/disease/', {'term': 'BatchImportTest', 'diseaseId': 'Orphanet_9998'}],
+        ['/disease/', {'foo': 'bar'}],
+        ['/disease/', {'uuid': disease['uuid'], 'term': 'Duplicate', 'diseaseId': 'Orphanet_9997'}],
+    ]
+    res = testapp.post_json('/batch_import', {'item_type': 'disease', 'items': items})
+    created, invalid, conflict = res.json['results']
+    assert created['status'] == 201
+    assert invalid['status'] == 422
+    assert invalid['errors']
+    assert conflict['status'] == 409
+    item = testapp.get(created['@id']).json
+    assert item['term'] == 'BatchImportTest'
+
+    items = [[created['@id'], {'term': 'BatchImportTestAgain', 'diseaseId': 'Orphanet_9998'}]]
+    res = testapp.post_json(
+        '/batch_import', {'item_type': 'disease', 'method': 'PUT', 'items': items})
+    updated, = res.json['results']
+    assert updated['status'] == 200
+    assert testapp.get(created['@id']).json['term'] == 'BatchImportTestAgain'
+
+
+def test_batch_import_admin_only(authenticated_testapp):
+    items = [['/user/', {'email': 'batch_import@example.org', 'groups': ['admin']}]]
+    authenticated_testapp.post_json(
+        '/batch_import', {'item_type': 'user', 'items': items}, status=403)
+
+
+def test_can_batch_import(testapp, authenticated_testapp):
+    from ..loadxl import can_batch_import
+    assert can_batch_import(testapp)
+    assert not can_batch_import(authenticated_testapp)
+
+
+@pytest.mark.parametrize('body', [
+    {'items': []},
+    {'item_type': 'disease'},
+    {'item_type': 'no_such_type', 'items': []},
+    {'item_type': 'disease', 'items': {}},
+    {'item_type': 'disease', 'method': 'PATCH', 'items': []},
+])
+def test_batch_import_bad_request(testapp, body):
+    testapp.post_json('/batch_import', body, status=400)
+
+
 # def test_user_effective_principals(submitter, lab, anontestapp, execute_counter):
 #     email = submitter['email']
 #     with execute_counter.expect(1):
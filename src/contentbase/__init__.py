@@ -14,12 +14,15 @@ def includeme(config):
     config.include('pyramid_tm')
     config.include('.stats')
     config.include('.batchupgrade')
+    config.include('.batchimport')
     config.include('.calculated')
     config.include('.embedding')
     config.include('.json_renderer')
     config.include('.validation')
+    config.include('.schema_utils')
     config.include('.predicates')
     config.include('.invalidation')
+    config.include('.object_cache')
     config.include('.upgrader')
     config.include('.auditor')
     config.include('.resources')
@@ -4,15 +4,21 @@ Schema validation allows for checking values within a single object.
 We also need to perform higher order checking between linked objects.
 """
 
+from contextlib import contextmanager
 from past.builtins import basestring
+from .cache import DependencyLRUCache
+from .stats import stats_incr
 import logging
+import time
 import venusian
 
 logger = logging.getLogger(__name__)
 
 
 def includeme(config):
-    config.registry['auditor'] = Auditor()
+    settings = config.registry.settings
+    cache_capacity = int(settings.get('contentbase.auditor.cache_capacity', 0))
+    config.registry['auditor'] = Auditor(cache_capacity=cache_capacity)
     config.add_directive('add_audit_checker', add_audit_checker)
     config.add_request_method(audit, 'audit')
 
@@ -60,11 +66,21 @@ class AuditFailure(Exception):
 
 class Auditor(object):
     """ Data audit manager
+
+    Checkers sharing a frame are run against a single fetch of that frame.
+
+    With ``cache_capacity`` set checker results are cached keyed on the tids
+    of the uuids embedded in their frame and are reused while those and any
+    uuids the checkers embedded themselves are unchanged. The uuids checkers
+    embedded or linked are added to the request again on a hit so they are
+    still recorded as dependencies when indexing. Checkers looking up other
+    items directly through the root are not tracked.
     """
     _order = 0
 
-    def __init__(self):
+    def __init__(self, cache_capacity=0):
         self.type_checkers = {}
+        self.cache = DependencyLRUCache(cache_capacity) if cache_capacity else None
 
     def add_audit_checker(self, checker, item_type, condition=None, frame='embedded'):
         checkers = self.type_checkers.setdefault(item_type, [])
@@ -78,66 +94,168 @@ class Auditor(object):
             types = [types]
         checkers = set()
         checkers.update(*(self.type_checkers.get(item_type, ()) for item_type in types))
-        errors = []
         system = {
             'request': request,
             'path': path,
             'types': types,
         }
         system.update(kw)
-        for order, checker, condition, frame in sorted(checkers):
+        cache = self.cache
+        root = (system.get('root') or request.root) if cache is not None else None
+
+        # Fetch each frame once.
+        checkers = sorted(checkers)
+        values = {}
+        frame_tids = {}
+        for order, checker, condition, frame in checkers:
+            if frame in values:
+                continue
             if frame is None:
                 uri = path
             elif isinstance(frame, basestring):
                 uri = '%s@@%s' % (path, frame)
             else:
                 uri = '%s@@expand?expand=%s' % (path, '&expand='.join(frame))
-            value = request.embed(uri)
+            if cache is None:
+                values[frame] = request.embed(uri)
+            else:
+                with recording_uuids(request) as (embedded, linked):
+                    values[frame] = request.embed(uri)
+                frame_tids[frame] = uuid_tids(root, embedded)
+        stats_incr('audit_frame_count', len(values))
 
-            if condition is not None:
-                try:
-                    if not condition(value, system):
+        results = {}
+        keys = {}
+        if cache is not None:
+            principals = tuple(sorted(request.effective_principals))
+            for order, checker, condition, frame in checkers:
+                key = (checker.__module__, checker.__name__, path, frame_tids[frame], principals)
+                entry = cache.get(key)
+                if entry is not None:
+                    checker_errors, extra, extra_linked = entry[0]
+                    if uuid_tids(root, (uuid for uuid, tid in extra)) == extra:
+                        stats_incr('audit_cache_hits')
+                        results[order] = [dict(error) for error in checker_errors]
+                        request._embedded_uuids.update(uuid for uuid, tid in extra)
+                        request._linked_uuids.update(extra_linked)
                         continue
-                except Exception as e:
-                    detail = '%s: %r' % (checker.__name__, e)
-                    failure = AuditFailure(
-                        'audit condition error', detail, 'ERROR', path, checker.__name__)
-                    errors.append(failure.__json__(request))
-                    logger.warning('audit condition error auditing %s', path, exc_info=True)
-                    continue
-            try:
-                try:
-                    result = checker(value, system)
-                except AuditFailure as e:
-                    e = e.__json__(request)
-                    if e['path'] is None:
-                        e['path'] = path
-                    e['name'] = checker.__name__
-                    errors.append(e)
-                    continue
-                if result is None:
-                    continue
-                if isinstance(result, AuditFailure):
-                    result = [result]
-                for item in result:
-                    if isinstance(item, AuditFailure):
-                        item = item.__json__(request)
-                        if item['path'] is None:
-                            item['path'] = path
-                        item['name'] = checker.__name__
-                        errors.append(item)
-                        continue
-                    raise ValueError(item)
-            except Exception as e:
-                detail = '%s: %r' % (checker.__name__, e)
-                failure = AuditFailure(
-                    'audit script error', detail, 'ERROR', path, checker.__name__)
-                errors.append(failure.__json__(request))
-                logger.warning('audit script error auditing %s', path, exc_info=True)
-                continue
+                stats_incr('audit_cache_misses')
+                keys[order] = key
+
+        jobs = [
+            (checker, condition, values[frame])
+            for order, checker, condition, frame in checkers
+            if order not in results
+        ]
+        with recording_uuids(request, enabled=cache is not None) as (embedded, linked):
+            outputs = [run_checker(job, system) for job in jobs]
+
+        if keys:
+            # Uuids embedded or linked by checkers themselves are shared between them.
+            extra = uuid_tids(root, embedded)
+            extra_linked = tuple(sorted(linked))
+        misses = (order for order, checker, condition, frame in checkers if order not in results)
+        for order, (checker, condition, value), (checker_errors, duration) in zip(
+                misses, jobs, outputs):
+            results[order] = checker_errors
+            stats_incr('audit_count')
+            stats_incr('audit_time', duration)
+            stats_incr('audit_%s_time' % checker.__name__, duration)
+            if order in keys:
+                cache.set(keys[order], (
+                    [dict(error) for error in checker_errors], extra, extra_linked))
+
+        errors = []
+        for order, checker, condition, frame in checkers:
+            errors.extend(results[order])
         return errors
 
 
+@contextmanager
+def recording_uuids(request, enabled=True):
+    """ Collect the uuids embedded and linked within the block into new sets.
+
+    They are also added to the request's own sets on exit.
+    """
+    if not enabled:
+        yield set(), set()
+        return
+    outer_embedded = request._embedded_uuids
+    outer_linked = request._linked_uuids
+    embedded = request._embedded_uuids = set()
+    linked = request._linked_uuids = set()
+    try:
+        yield embedded, linked
+    finally:
+        request._embedded_uuids = outer_embedded
+        request._linked_uuids = outer_linked
+        outer_embedded.update(embedded)
+        outer_linked.update(linked)
+
+
+def uuid_tids(root, uuids):
+    result = []
+    for uuid in uuids:
+        item = root.get_by_uuid(uuid)
+        result.append((uuid, None if item is None else str(item.tid)))
+    return tuple(sorted(result))
+
+
+def run_checker(job, system):
+    """ Returns a list of error dicts and the duration in microseconds.
+    """
+    checker, condition, value = job
+    errors = []
+    begin = time.time()
+    check_value(errors, checker, condition, value, system)
+    return errors, int((time.time() - begin) * 1e6)
+
+
+def check_value(errors, checker, condition, value, system):
+    request = system['request']
+    path = system['path']
+    if condition is not None:
+        try:
+            if not condition(value, system):
+                return
+        except Exception as e:
+            detail = '%s: %r' % (checker.__name__, e)
+            failure = AuditFailure(
+                'audit condition error', detail, 'ERROR', path, checker.__name__)
+            errors.append(failure.__json__(request))
+            logger.warning('audit condition error auditing %s', path, exc_info=True)
+            return
+    try:
+        try:
+            result = checker(value, system)
+        except AuditFailure as e:
+            e = e.__json__(request)
+            if e['path'] is None:
+                e['path'] = path
+            e['name'] = checker.__name__
+            errors.append(e)
+            return
+        if result is None:
+            return
+        if isinstance(result, AuditFailure):
+            result = [result]
+        for item in result:
+            if isinstance(item, AuditFailure):
+                item = item.__json__(request)
+                if item['path'] is None:
+                    item['path'] = path
+                item['name'] = checker.__name__
+                errors.append(item)
+                continue
+            raise ValueError(item)
+    except Exception as e:
+        detail = '%s: %r' % (checker.__name__, e)
+        failure = AuditFailure(
+            'audit script error', detail, 'ERROR', path, checker.__name__)
+        errors.append(failure.__json__(request))
+        logger.warning('audit script error auditing %s', path, exc_info=True)
+
+
 # Imperative configuration
 def add_audit_checker(config, checker, item_type, condition=None, frame='embedded'):
     auditor = config.registry['auditor']
@@ -0,0 +1,163 @@
+""" Import many items of one type in a single transaction.
+
+Used by loadxl in place of one POST or PUT request per row.
+"""
+from contextlib import contextmanager
+import logging
+from pyramid.httpexceptions import (
+    HTTPBadRequest,
+    HTTPConflict,
+    HTTPForbidden,
+    HTTPNotFound,
+)
+from pyramid.traversal import find_resource
+from pyramid.view import view_config
+from .resources import (
+    create_item,
+    update_item,
+)
+from .schema_utils import validate
+from .storage import DBSession
+from .validation import ValidationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def includeme(config):
+    config.add_route('batch_import', '/batch_import')
+    config.scan(__name__)
+
+
+@view_config(route_name='batch_import', request_method='POST', permission='batch_import')
+def batch_import(request):
+    """ POST or PUT a list of items of a single type.
+
+    The body is ``{"item_type": ..., "method": "POST"|"PUT", "items": [[path,
+    properties], ...]}``. Each item gets an HTTP style status in the results.
+    Rows are written in batches each within a savepoint. Should any write in
+    a batch fail the batch is rolled back and written again a row at a time
+    so that only the failed rows are lost.
+
+    The ``batch_import`` permission should only be granted to admins. Each
+    row is also checked for the ``add`` permission on the collection or the
+    ``edit`` permission on the item as the equivalent request would be.
+    """
+    request.datastore = 'database'
+    try:
+        item_type = request.json['item_type']
+        items = request.json['items']
+        collection = request.root.by_item_type[item_type]
+        batch_size = int(request.json.get('batch_size', 100))
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPBadRequest(detail='Invalid batch: %r' % e)
+    if not isinstance(items, list):
+        raise HTTPBadRequest(detail='items must be a list')
+    method = request.json.get('method', 'POST')
+    if method not in ('POST', 'PUT'):
+        raise HTTPBadRequest(detail='Unsupported method: %r' % method)
+
+    results = []
+    for start in range(0, len(items), batch_size):
+        results.extend(import_batch(request, collection, method, items[start:start + batch_size]))
+    return {'results': results}
+
+
+def import_batch(request, collection, method, batch):
+    session = DBSession()
+    sp = session.begin_nested()
+    try:
+        results = [
+            import_item(request, collection, method, path, properties)
+            for path, properties in batch
+        ]
+        sp.commit()
+        return results
+    except (HTTPConflict, ValidationFailure):
+        sp.rollback()
+
+    results = []
+    for path, properties in batch:
+        sp = session.begin_nested()
+        try:
+            result = import_item(request, collection, method, path, properties)
+            sp.commit()
+        except (HTTPConflict, ValidationFailure) as e:
+            sp.rollback()
+            logger.warning('Error importing %s: %s', path, e.detail)
+            result = error_result(e, path)
+        results.append(result)
+    return results
+
+
+def import_item(request, collection, method, path, properties):
+    """ Validate and write an item.
+
+    Invalid items are reported in the result. Errors while writing are raised.
+    """
+    try:
+        context, validated = validate_item(request, collection, method, path, properties)
+    except (KeyError, HTTPForbidden, ValidationFailure) as e:
+        return error_result(e, path)
+    if context is None:
+        context = create_item(collection.type_info, request, validated)
+        status = 201
+    else:
+        update_item(context, request, validated)
+        status = 200
+    return {'status': status, '@id': request.resource_path(context)}
+
+
+def validate_item(request, collection, method, path, properties):
+    """ Returns the item to update, or None to create one, and its validated properties.
+    """
+    schema = collection.type_info.schema
+    if method == 'POST':
+        if not request.has_permission('add', collection):
+            raise HTTPForbidden(detail='add permission required')
+        context = None
+        current = None
+    else:
+        context = find_resource(request.root, path)
+        if not request.has_permission('edit', context):
+            raise HTTPForbidden(detail='edit permission required')
+        if 'uuid' in properties and properties['uuid'] != str(context.uuid):
+            raise ValidationFailure('body', ['uuid'], 'uuid may not be changed')
+        current = context.upgrade_properties().copy()
+        current['uuid'] = str(context.uuid)
+    with row_request(request, method, collection if context is None else context):
+        validated, errors = validate(schema, properties, current)
+    if errors:
+        failure = ValidationFailure()
+        failure.detail = [
+            {'location': 'body', 'name': list(error.path), 'description': error.message}
+            for error in errors
+        ]
+        raise failure
+    return context, validated
+
+
+@contextmanager
+def row_request(request, method, context):
+    """ Present the request to schema validators as the row's POST or PUT.
+
+    The permission and requestMethod validators check the current request.
+    """
+    environ = request.environ
+    original = environ['REQUEST_METHOD'], request.context
+    environ['REQUEST_METHOD'] = method
+    request.context = context
+    try:
+        yield
+    finally:
+        environ['REQUEST_METHOD'], request.context = original
+
+
+def error_result(e, path):
+    if isinstance(e, KeyError):
+        e = HTTPNotFound()
+    result = {'status': e.code, '@id': path}
+    if isinstance(e, ValidationFailure):
+        result['errors'] = e.detail if isinstance(e.detail, list) else [e.detail]
+    else:
+        result['detail'] = e.detail
+    return result
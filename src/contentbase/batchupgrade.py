@@ -5,12 +5,21 @@ Example:
 
     %(prog)s production.ini --app-name app
 
+Upgrade one type at a time, resuming an interrupted run:
+
+    %(prog)s production.ini --app-name app --order-by-type --checkpoint upgrade.ckpt
+
 """
+import json
 import logging
+import os
+import queue
+import time
 import transaction
 from copy import deepcopy
 from contentbase.storage import (
     DBSession,
+    Resource,
     update_keys,
     update_rels,
 )
@@ -21,7 +30,6 @@ EPILOG = __doc__
 logger = logging.getLogger(__name__)
 
 from .schema_utils import validate
-import itertools
 
 
 def includeme(config):
@@ -30,9 +38,33 @@ def includeme(config):
 
 
 def batched(iterable, n=1):
-    l = len(iterable)
-    for ndx in range(0, l, n):
-        yield iterable[ndx:min(ndx+n, l)]
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_uuids(session, types=None, order_by_type=False, batch_size=500):
+    """ Stream uuids from a server side cursor in a stable order.
+
+    With ``types`` or ``order_by_type`` items are grouped by type, in the order
+    given or alphabetically.
+    """
+    if types is None and order_by_type:
+        query = session.query(Resource.item_type).distinct()
+        types = sorted(item_type for item_type, in query)
+    if types is None:
+        types = [None]
+    for item_type in types:
+        query = session.query(Resource.rid)
+        if item_type is not None:
+            query = query.filter(Resource.item_type == item_type)
+        for rid, in query.order_by(Resource.rid).yield_per(batch_size):
+            yield str(rid)
 
 
 def internal_app(configfile, app_name=None, username=None):
@@ -58,8 +90,44 @@ def initializer(*args, **kw):
 
 
 def worker(batch):
+    begin = time.time()
     res = testapp.post_json('/batch_upgrade', {'batch': batch})
-    return res.json
+    result = res.json
+    result['pid'] = os.getpid()
+    result['duration'] = time.time() - begin
+    return result
+
+
+class Checkpoint(object):
+    """ Records completed batches by their first and last uuid.
+
+    Batches are enumerated in a stable order so a restarted run skips those
+    already recorded. Should items have been added meanwhile the shifted
+    batches are simply upgraded again.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.completed = set()
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.completed.add((entry['first'], entry['last']))
+        self._file = None if path is None else open(path, 'a')
+
+    def __contains__(self, batch):
+        return (batch[0], batch[-1]) in self.completed
+
+    def record(self, first, last, count):
+        if self._file is None:
+            return
+        self._file.write(json.dumps({'first': first, 'last': last, 'count': count}) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
 
 
 def update_item(context):
@@ -130,7 +198,20 @@ def batch_upgrade(request):
     return {'results': results}
 
 
-def run(config_uri, app_name=None, username=None, types=None, batch_size=500, processes=None):
+def wait_result(done, timeout):
+    """ Return the next worker result, raising any worker exception.
+    """
+    try:
+        result = done.get(timeout=timeout)
+    except queue.Empty:
+        raise RuntimeError('No batch completed within %d seconds' % timeout)
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+def run(config_uri, app_name=None, username=None, types=None, batch_size=500, processes=None,
+        order_by_type=False, checkpoint=None, batch_timeout=3600):
     # multiprocessing.get_context is Python 3 only.
     from multiprocessing import get_context
     from multiprocessing.pool import Pool
@@ -138,11 +219,10 @@ def run(config_uri, app_name=None, username=None, types=None, batch_size=500, pr
     # Loading app will have configured from config file. Reconfigure here:
     logging.getLogger('contentbase').setLevel(logging.DEBUG)
 
-    testapp = internal_app(config_uri, app_name, username)
-    connection = testapp.app.registry['connection']
-    uuids = [str(uuid) for uuid in connection]
-    transaction.abort()
-    logger.info('Total items: %d' % len(uuids))
+    internal_app(config_uri, app_name, username)
+    checkpoint = Checkpoint(checkpoint)
+    if checkpoint.completed:
+        logger.info('Resuming: %d batches already completed' % len(checkpoint.completed))
 
     pool = Pool(
         processes=processes,
@@ -151,30 +231,69 @@ def run(config_uri, app_name=None, username=None, types=None, batch_size=500, pr
         context=get_context('forkserver'),
     )
 
-    all_results = []
+    # Uuids are read and batches submitted from this thread. Results and worker
+    # exceptions arrive on the done queue, at most max_in_flight batches are
+    # outstanding at once.
+    max_in_flight = (processes or os.cpu_count() or 1) * 2
+    done = queue.Queue()
+    session = DBSession()
+
+    by_type = {}
+    by_worker = {}
+
+    def handle(result):
+        results = result['results']
+        errors = sum(error for item_type, path, update, error in results)
+        updated = sum(update for item_type, path, update, error in results)
+        rate = len(results) / result['duration'] if result['duration'] else 0
+        logger.info('Batch: Updated %d of %d (errors %d) %.1f items/sec (pid %d)' %
+                    (updated, len(results), errors, rate, result['pid']))
+        for item_type, path, update, error in results:
+            # Ensure we always use a string
+            counts = by_type.setdefault(item_type or '', [0, 0, 0])
+            counts[0] += 1
+            counts[1] += update
+            counts[2] += error
+        worker_counts = by_worker.setdefault(result['pid'], [0, 0.0])
+        worker_counts[0] += len(results)
+        worker_counts[1] += result['duration']
+        # Batches with errors are retried when resuming.
+        if not errors:
+            checkpoint.record(results[0][1], results[-1][1], len(results))
+
+    begin = time.time()
     try:
-        for result in pool.imap_unordered(worker, batched(uuids, batch_size), chunksize=1):
-            results = result['results']
-            errors = sum(error for item_type, path, update, error in results)
-            updated = sum(update for item_type, path, update, error in results)
-            logger.info('Batch: Updated %d of %d (errors %d)' %
-                        (updated, len(results), errors))
-            all_results.extend(results)
+        in_flight = 0
+        skipped = 0
+        for batch in batched(iter_uuids(session, types, order_by_type, batch_size), batch_size):
+            if batch in checkpoint:
+                skipped += len(batch)
+                continue
+            if in_flight >= max_in_flight:
+                handle(wait_result(done, batch_timeout))
+                in_flight -= 1
+            pool.apply_async(worker, (batch,), callback=done.put, error_callback=done.put)
+            in_flight += 1
+        logger.info('All batches dispatched (%d items skipped)' % skipped)
+        while in_flight:
+            handle(wait_result(done, batch_timeout))
+            in_flight -= 1
     finally:
         pool.terminate()
         pool.join()
+        checkpoint.close()
+        transaction.abort()
 
-    def result_item_type(result):
-        # Ensure we always return a string
-        return result[0] or ''
-
-    for item_type, results in itertools.groupby(
-            sorted(all_results, key=result_item_type), key=result_item_type):
-        results = list(results)
-        errors = sum(error for item_type, path, update, error in results)
-        updated = sum(update for item_type, path, update, error in results)
+    for item_type, (count, updated, errors) in sorted(by_type.items()):
         logger.info('Collection %s: Updated %d of %d (errors %d)' %
-                    (item_type, updated, len(results), errors))
+                    (item_type, updated, count, errors))
+    for pid, (count, duration) in sorted(by_worker.items()):
+        logger.info('Worker %d: %d items in %.1fs (%.1f items/sec)' %
+                    (pid, count, duration, count / duration if duration else 0))
+    duration = time.time() - begin
+    total = sum(count for count, worker_duration in by_worker.values())
+    logger.info('Total: %d items in %.1fs (%.1f items/sec)' %
+                (total, duration, total / duration if duration else 0))
 
 
 def main():
@@ -185,8 +304,18 @@ def main():
     )
     parser.add_argument('config_uri', help="path to configfile")
     parser.add_argument('--app-name', help="Pyramid app name in configfile")
-    parser.add_argument('--item-type', dest='types', action='append')
+    parser.add_argument(
+        '--item-type', dest='types', action='append',
+        help="Only upgrade these types, in the order given")
+    parser.add_argument(
+        '--order-by-type', action='store_true',
+        help="Upgrade one type at a time")
+    parser.add_argument(
+        '--checkpoint', help="File recording completed batches to resume from")
     parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument(
+        '--batch-timeout', type=int, default=3600,
+        help="Give up when no batch completes within this many seconds")
     parser.add_argument('--processes', type=int)
     parser.add_argument('--username')
     args = parser.parse_args()
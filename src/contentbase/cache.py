@@ -1,5 +1,10 @@
+from collections import (
+    OrderedDict,
+    defaultdict,
+)
 from pyramid.threadlocal import manager
 from sqlalchemy.util import LRUCache
+import threading
 
 
 class ManagerLRUCache(object):
@@ -41,3 +46,98 @@ class ManagerLRUCache(object):
         if cache is None:
             return
         self.cache[key] = value
+
+
+class DependencyLRUCache(object):
+    """ Process wide LRU cache with uuid based invalidation.
+
+    Each entry records the uuids it embeds and links to. Invalidating with a
+    transaction's ``updated`` and ``renamed`` lists removes exactly the entries
+    depending on them. ``generation`` is bumped on every invalidation so a
+    writer that started before it can refuse to store a possibly stale value.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._embedded = defaultdict(set)
+        self._linked = defaultdict(set)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, embedded, linked = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, embedded, linked
+
+    def set(self, key, value, embedded=(), linked=(), generation=None):
+        """ Store an entry, returning the number of entries evicted.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return 0
+            self._remove(key)
+            embedded = frozenset(embedded)
+            linked = frozenset(linked)
+            self._data[key] = (value, embedded, linked)
+            for uuid in embedded:
+                self._embedded[uuid].add(key)
+            for uuid in linked:
+                self._linked[uuid].add(key)
+            evicted = 0
+            while len(self._data) > self.capacity:
+                self._remove(next(iter(self._data)))
+                evicted += 1
+            self.evictions += evicted
+            return evicted
+
+    def invalidate(self, updated=(), renamed=()):
+        """ Remove entries embedding ``updated`` or linking to ``renamed`` uuids.
+        """
+        with self._lock:
+            self.generation += 1
+            keys = set()
+            for uuid in updated:
+                keys.update(self._embedded.get(uuid, ()))
+            for uuid in renamed:
+                keys.update(self._linked.get(uuid, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self._embedded.clear()
+            self._linked.clear()
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        value, embedded, linked = entry
+        for index, uuids in ((self._embedded, embedded), (self._linked, linked)):
+            for uuid in uuids:
+                keys = index.get(uuid)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if not keys:
+                    del index[uuid]
@@ -11,12 +11,19 @@ def includeme(config):
     config.scan(__name__)
 
 
+def record_dependencies(request, source):
+    # As Item.__json__ and __resource_url__ would have when rendering.
+    request._embedded_uuids.update(source['embedded_uuids'])
+    request._linked_uuids.update(source['linked_uuids'])
+
+
 @view_config(context=ICachedItem, request_method='GET', name='embedded')
 def cached_view_embedded(context, request):
     source = context.model.source
     allowed = set(source['principals_allowed']['view'])
     if allowed.isdisjoint(request.effective_principals):
         raise HTTPForbidden()
+    record_dependencies(request, source)
     return source['embedded']
 
 
@@ -26,6 +33,7 @@ def cached_view_object(context, request):
     allowed = set(source['principals_allowed']['view'])
     if allowed.isdisjoint(request.effective_principals):
         raise HTTPForbidden()
+    record_dependencies(request, source)
     return source['object']
 
 
@@ -1,5 +1,8 @@
+from bisect import bisect_left
+from contentbase.cache import ManagerLRUCache
 from contentbase.util import get_root_request
 from elasticsearch.helpers import scan
+from pyramid.settings import asbool
 from pyramid.threadlocal import get_current_request
 from zope.interface import alsoProvides
 from .interfaces import (
@@ -8,13 +11,22 @@ from .interfaces import (
 )
 
 
+# Documents fetched for the current request, keyed by uuid.
+model_cache = ManagerLRUCache('contentbase.elasticsearch.model_cache', 1000)
+unique_key_cache = ManagerLRUCache('contentbase.elasticsearch.key_cache', 1000)
+
+
 def includeme(config):
     from contentbase import STORAGE
     registry = config.registry
     es = registry[ELASTIC_SEARCH]
     es_index = registry.settings['contentbase.elasticsearch.index']
+    exclude_invalidated = asbool(
+        registry.settings.get('contentbase.elasticsearch.exclude_invalidated', False))
     wrapped_storage = registry[STORAGE]
-    registry[STORAGE] = PickStorage(ElasticSearchStorage(es, es_index), wrapped_storage)
+    registry[STORAGE] = PickStorage(
+        ElasticSearchStorage(es, es_index, exclude_invalidated), wrapped_storage)
+    config.add_request_method(recent_edits, '_recent_edits', reify=True)
 
 
 class CachedModel(object):
@@ -46,26 +58,62 @@ class CachedModel(object):
         request = get_root_request()
         if request is None:
             return False
-        edits = dict.get(request.session, 'edits', None)
-        if edits is None:
-            return False
-        version = self.hit['_version']
-        source = self.source
-        linked_uuids = set(source['linked_uuids'])
-        embedded_uuids = set(source['embedded_uuids'])
-        for xid, updated, linked in edits:
-            if xid < version:
-                continue
-            if not embedded_uuids.isdisjoint(updated):
-                return True
-            if not linked_uuids.isdisjoint(linked):
-                return True
-        return False
+        return request._recent_edits.invalidates(self.source, self.hit['_version'])
 
     def used_for(self, item):
         alsoProvides(item, ICachedItem)
 
 
+class RecentEdits(object):
+    """ The uuids updated and renamed by the session's recent edits.
+
+    Built once per request so checking whether a document is invalidated is
+    a membership test of its embedded and linked uuids rather than building
+    sets from them for every lookup.
+    """
+    def __init__(self, edits=()):
+        edits = sorted(edits, key=lambda edit: edit[0])
+        self.xids = [edit[0] for edit in edits]
+        # since[i] is the union of the uuids updated and renamed by edits[i:]
+        self.since = []
+        updated = frozenset()
+        linked = frozenset()
+        for xid, edit_updated, edit_linked in reversed(edits):
+            updated = updated.union(edit_updated)
+            linked = linked.union(edit_linked)
+            self.since.append((updated, linked))
+        self.since.reverse()
+
+    def __bool__(self):
+        return bool(self.xids)
+
+    __nonzero__ = __bool__
+
+    @property
+    def updated(self):
+        return self.since[0][0] if self.since else frozenset()
+
+    @property
+    def linked(self):
+        return self.since[0][1] if self.since else frozenset()
+
+    def invalidates(self, source, version):
+        """ Whether a document indexed at ``version`` predates an edit it depends on.
+        """
+        index = bisect_left(self.xids, version)
+        if index == len(self.xids):
+            return False
+        updated, linked = self.since[index]
+        return not (
+            updated.isdisjoint(source['embedded_uuids']) and
+            linked.isdisjoint(source['linked_uuids'])
+        )
+
+
+def recent_edits(request):
+    return RecentEdits(dict.get(request.session, 'edits', None) or ())
+
+
 class PickStorage(object):
     def __init__(self, read, write):
         self.read = read
@@ -93,6 +141,38 @@ class PickStorage(object):
                 return self.write.get_by_unique_key(unique_key, name)
         return model
 
+    def get_many_by_uuid(self, uuids):
+        storage = self.storage()
+        if storage is not self.read:
+            return storage.get_many_by_uuid(uuids)
+        uuids = [str(uuid) for uuid in uuids]
+        models = [
+            model for model in self.read.get_many_by_uuid(uuids)
+            if not model.invalidated()
+        ]
+        found = {model.uuid for model in models}
+        missing = [uuid for uuid in uuids if uuid not in found]
+        if missing:
+            models.extend(self.write.get_many_by_uuid(missing))
+        return models
+
+    def get_many_by_unique_key(self, unique_key, names):
+        storage = self.storage()
+        if storage is not self.read:
+            return storage.get_many_by_unique_key(unique_key, names)
+        names = set(names)
+        models = [
+            model for model in self.read.get_many_by_unique_key(unique_key, names)
+            if not model.invalidated()
+        ]
+        found = set()
+        for model in models:
+            found.update(model.source['unique_keys'].get(unique_key, ()))
+        missing = names - found
+        if missing:
+            models.extend(self.write.get_many_by_unique_key(unique_key, missing))
+        return models
+
     def get_rev_links(self, model, rel, *item_types):
         return self.storage().get_rev_links(model, rel, *item_types)
 
@@ -112,9 +192,32 @@ class PickStorage(object):
 class ElasticSearchStorage(object):
     writeable = False
 
-    def __init__(self, es, index):
+    def __init__(self, es, index, exclude_invalidated=False):
         self.es = es
         self.index = index
+        self.exclude_invalidated = exclude_invalidated
+
+    def _filter(self, filter_):
+        """ Optionally exclude documents invalidated by recent edits in the query.
+
+        Document versions may not be queried so this excludes any document
+        depending on a recent edit, even if it has since been reindexed. Those
+        are then read from the database.
+        """
+        if not self.exclude_invalidated:
+            return filter_
+        request = get_root_request()
+        if request is None or not request._recent_edits:
+            return filter_
+        edits = request._recent_edits
+        exclude = []
+        if edits.updated:
+            exclude.append({'terms': {'embedded_uuids': sorted(edits.updated), '_cache': False}})
+        if edits.linked:
+            exclude.append({'terms': {'linked_uuids': sorted(edits.linked), '_cache': False}})
+        if not exclude:
+            return filter_
+        return {'and': [filter_, {'not': {'or': exclude}}]}
 
     def _one(self, query):
         data = self.es.search(index=self.index, body=query)
@@ -122,22 +225,81 @@ class ElasticSearchStorage(object):
         if len(hits) != 1:
             return None
         model = CachedModel(hits[0])
+        model_cache[model.uuid] = model
         return model
 
     def get_by_uuid(self, uuid):
+        model = model_cache.get(str(uuid))
+        if model is not None:
+            return model
         query = {
-            'filter': {'term': {'uuid': uuid}},
+            'filter': self._filter({'term': {'uuid': uuid}}),
             'version': True,
         }
         return self._one(query)
 
     def get_by_unique_key(self, unique_key, name):
+        uuid = unique_key_cache.get((unique_key, name))
+        if uuid is not None:
+            return self.get_by_uuid(uuid)
         term = 'unique_keys.' + unique_key
         query = {
-            'filter': {'term': {term: name}},
+            'filter': self._filter({'term': {term: name}}),
             'version': True,
         }
-        return self._one(query)
+        model = self._one(query)
+        if model is not None:
+            unique_key_cache[(unique_key, name)] = model.uuid
+        return model
+
+    def get_many_by_uuid(self, uuids):
+        """ Fetch documents by id with a single _mget.
+        """
+        models = []
+        missing = []
+        for uuid in uuids:
+            model = model_cache.get(str(uuid))
+            if model is None:
+                missing.append(str(uuid))
+            else:
+                models.append(model)
+        if not missing:
+            return models
+        data = self.es.mget(index=self.index, body={'ids': missing})
+        for doc in data['docs']:
+            if not doc.get('found'):
+                continue
+            model = CachedModel(doc)
+            model_cache[model.uuid] = model
+            models.append(model)
+        return models
+
+    def get_many_by_unique_key(self, unique_key, names):
+        models = []
+        missing = []
+        for name in names:
+            uuid = unique_key_cache.get((unique_key, name))
+            model = model_cache.get(uuid) if uuid is not None else None
+            if model is None:
+                missing.append(name)
+            else:
+                models.append(model)
+        if not missing:
+            return models
+        term = 'unique_keys.' + unique_key
+        query = {
+            'filter': self._filter({'terms': {term: missing}}),
+            'version': True,
+            'size': len(missing),
+        }
+        data = self.es.search(index=self.index, body=query)
+        for hit in data['hits']['hits']:
+            model = CachedModel(hit)
+            model_cache[model.uuid] = model
+            for name in model.source['unique_keys'].get(unique_key, ()):
+                unique_key_cache[(unique_key, name)] = model.uuid
+            models.append(model)
+        return models
 
     def get_rev_links(self, model, rel, *item_types):
         filter_ = {'term': {'links.' + rel: str(model.uuid)}}
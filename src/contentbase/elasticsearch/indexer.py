@@ -2,16 +2,24 @@ from elasticsearch.exceptions import (
     ConflictError,
     NotFoundError,
 )
+from pyramid.settings import asbool
 from pyramid.view import view_config
+from sqlalchemy import (
+    and_,
+    or_,
+)
 from sqlalchemy.exc import StatementError
+from contentbase.json_renderer import json_renderer
 from contentbase.storage import (
     DBSession,
+    Dependency,
     TransactionRecord,
 )
 from .interfaces import ELASTIC_SEARCH
 import datetime
 import logging
 import pytz
+import time
 
 
 log = logging.getLogger(__name__)
@@ -59,24 +67,28 @@ def index(request):
 
     first_txn = None
     last_xmin = None
+    try:
+        status = es.get(index=INDEX, doc_type='meta', id='indexing')['_source']
+    except NotFoundError:
+        status = {}
     if 'last_xmin' in request.json:
         last_xmin = request.json['last_xmin']
     else:
-        try:
-            status = es.get(index=INDEX, doc_type='meta', id='indexing')
-        except NotFoundError:
-            pass
-        else:
-            last_xmin = status['_source']['xmin']
+        last_xmin = status.get('xmin')
 
     result = {
         'xmin': xmin,
         'last_xmin': last_xmin,
     }
 
+    # The dependency table is only complete once a full reindex has recorded it.
+    # Nothing can be recorded on a standby server.
+    dependencies = not recovery and has_dependency_table(connection)
+
     if last_xmin is None:
         result['types'] = types = request.json.get('types', None)
         invalidated = all_uuids(request.root, types)
+        result['dependencies'] = dependencies and types is None
     else:
         txns = session.query(TransactionRecord).filter(
             TransactionRecord.xid >= last_xmin,
@@ -101,30 +113,40 @@ def index(request):
         if txn_count == 0:
             return result
 
-        es.indices.refresh(index=INDEX)
-        res = es.search(index=INDEX, size=SEARCH_MAX, body={
-            'filter': {
-                'or': [
-                    {
-                        'terms': {
-                            'embedded_uuids': updated,
-                            '_cache': False,
+        if dependencies and status.get('dependencies'):
+            result['dependencies'] = True
+            referencing = find_dependents(session, updated, renamed)
+        else:
+            result['dependencies'] = False
+            es.indices.refresh(index=INDEX)
+            res = es.search(index=INDEX, size=SEARCH_MAX, body={
+                'filter': {
+                    'or': [
+                        {
+                            'terms': {
+                                'embedded_uuids': updated,
+                                '_cache': False,
+                            },
                         },
-                    },
-                    {
-                        'terms': {
-                            'linked_uuids': renamed,
-                            '_cache': False,
+                        {
+                            'terms': {
+                                'linked_uuids': renamed,
+                                '_cache': False,
+                            },
                         },
-                    },
-                ],
-            },
-            '_source': False,
-        })
-        if res['hits']['total'] > SEARCH_MAX:
+                    ],
+                },
+                '_source': False,
+            })
+            if res['hits']['total'] > SEARCH_MAX:
+                referencing = None
+            else:
+                referencing = {hit['_id'] for hit in res['hits']['hits']}
+
+        if referencing is None:
             invalidated = all_uuids(request.root)
+            result['dependencies'] = dependencies
         else:
-            referencing = {hit['_id'] for hit in res['hits']['hits']}
             invalidated = referencing | updated
             result.update(
                 max_xid=max_xid,
@@ -137,9 +159,22 @@ def index(request):
             )
 
     if not dry_run:
-        result['indexed'] = indexer.update_objects(request, invalidated, xmin, snapshot_id)
+        begin = time.time()
+        result['indexed'] = indexed = indexer.update_objects(
+            request, invalidated, xmin, snapshot_id)
+        duration = time.time() - begin
+        result['indexing_time'] = round(duration, 3)
+        if duration > 0:
+            result['docs_per_sec'] = round(indexed / duration, 1)
         if record:
             es.index(index=INDEX, doc_type='meta', body=result, id='indexing')
+        if indexed:
+            # Search caches are keyed on this, so bump it on every pass that
+            # changed the index, recorded or not.
+            es.index(index=INDEX, doc_type='meta', id='generation', body={
+                'xmin': xmin,
+                'timestamp': datetime.datetime.now(pytz.utc).isoformat(),
+            })
 
         es.indices.refresh(index=INDEX)
 
@@ -149,6 +184,54 @@ def index(request):
     return result
 
 
+def has_dependency_table(connection):
+    return connection.dialect.has_table(connection, Dependency.__tablename__)
+
+
+def find_dependents(session, updated, renamed):
+    """ Return the uuids of documents embedding updated or linking renamed uuids.
+    """
+    clauses = []
+    if updated:
+        clauses.append(and_(Dependency.rel == 'embedded', Dependency.target_rid.in_(updated)))
+    if renamed:
+        clauses.append(and_(Dependency.rel == 'linked', Dependency.target_rid.in_(renamed)))
+    if not clauses:
+        return set()
+    query = session.query(Dependency.source_rid).filter(or_(*clauses)).distinct()
+    return {str(rid) for rid, in query}
+
+
+def dependency_data(result):
+    """ The part of an @@index-data result needed by ``record_dependencies``.
+    """
+    return {key: result[key] for key in ('uuid', 'embedded_uuids', 'linked_uuids')}
+
+
+def record_dependencies(documents):
+    """ Replace the recorded dependencies of freshly indexed documents.
+
+    ``documents`` is a list of ``dependency_data`` results. Written on a
+    separate connection as indexing runs in a read only transaction. Errors
+    are raised so an indexing run with an incomplete dependency table is not
+    recorded and gets retried.
+    """
+    if not documents:
+        return
+    table = Dependency.__table__
+    rows = [
+        {'source': doc['uuid'], 'rel': rel, 'target': target}
+        for doc in documents
+        for rel in ('embedded', 'linked')
+        for target in doc[rel + '_uuids']
+    ]
+    with DBSession.bind.begin() as connection:
+        connection.execute(table.delete().where(
+            table.c.source.in_([doc['uuid'] for doc in documents])))
+        if rows:
+            connection.execute(table.insert(), rows)
+
+
 def all_uuids(root, types=None):
     # First index user and access_key so people can log in
     initial = ['user', 'access_key']
@@ -172,23 +255,56 @@ class Indexer(object):
     def __init__(self, registry):
         self.es = registry[ELASTIC_SEARCH]
         self.index = registry.settings['contentbase.elasticsearch.index']
+        settings = registry.settings
+        self.bulk = asbool(settings.get('indexer.bulk', False))
+        self.bulk_size = int(settings.get('indexer.bulk_size', 500))
+        self.bulk_bytes = int(settings.get('indexer.bulk_bytes', 10 * 1024 * 1024))
 
     def update_objects(self, request, uuids, xmin, snapshot_id):
+        # Dependencies cannot be recorded when indexing from a standby server.
+        record = snapshot_id is not None
+        if self.bulk:
+            return self.bulk_update_objects(request, uuids, xmin, record)
+
+        return self.record_results(
+            self.update_object(request, uuid, xmin, record) for uuid in uuids)
+
+    def record_results(self, results):
+        """ Consume ``update_object`` results, returning the number indexed.
+
+        Dependencies are written in batches of ``indexer.bulk_size`` documents.
+        """
+        pending = []
         i = -1
-        for i, uuid in enumerate(uuids):
-            path = self.update_object(request, uuid, xmin)
+        for i, (path, dependencies) in enumerate(results):
+            if dependencies is not None:
+                pending.append(dependencies)
+                if len(pending) >= self.bulk_size:
+                    record_dependencies(pending)
+                    pending = []
 
             if (i + 1) % 50 == 0:
                 log.info('Indexing %s %d', path, i + 1)
 
+        record_dependencies(pending)
         return i + 1
 
-    def update_object(self, request, uuid, xmin):
+    def index_data(self, request, uuid):
         try:
-            result = request.embed('/%s/@@index-data' % uuid, as_user='INDEXER')
+            return request.embed('/%s/@@index-data' % uuid, as_user='INDEXER')
         except Exception:
             log.warning('Error indexing %s', uuid, exc_info=True)
-            return uuid
+            return None
+
+    def update_object(self, request, uuid, xmin, record=False):
+        """ Index a single document.
+
+        Returns its path and, when ``record`` is set and the document was
+        indexed, its ``dependency_data`` or else None.
+        """
+        result = self.index_data(request, uuid)
+        if result is None:
+            return uuid, None
 
         doctype = result['object']['@type'][0]
         try:
@@ -201,10 +317,86 @@ class Indexer(object):
             # Can't reconnect until invalid transaction is rolled back
             raise
         except ConflictError:
+            # A newer version was indexed along with its dependencies.
             log.warning('Conflict indexing %s at version %d', uuid, xmin, exc_info=True)
         except Exception:
             log.warning('Error indexing %s', uuid, exc_info=True)
-        return result['object']['@id']
+        else:
+            if record:
+                return result['object']['@id'], dependency_data(result)
+        return result['object']['@id'], None
+
+    def bulk_update_objects(self, request, uuids, xmin, record=False):
+        """ Index documents through the _bulk API.
+
+        Documents are buffered and flushed in batches bounded by both
+        ``indexer.bulk_size`` (documents) and ``indexer.bulk_bytes``.
+        """
+        count = 0
+        for batch in self.bulk_batches(request, uuids, xmin):
+            self.bulk_index(batch, xmin, record)
+            count += len(batch)
+            log.info('Indexing %s %d', batch[-1][0], count)
+        return count
+
+    def bulk_batches(self, request, uuids, xmin):
+        batch = []
+        batch_bytes = 0
+        for uuid in uuids:
+            result = self.index_data(request, uuid)
+            if result is None:
+                # Errors count towards the total as with update_object.
+                batch.append((uuid, None, None))
+                continue
+            action = json_renderer.dumps({
+                'index': {
+                    '_type': result['object']['@type'][0],
+                    '_id': str(uuid),
+                    '_version': xmin,
+                    '_version_type': 'external_gte',
+                },
+            })
+            source = json_renderer.dumps(result)
+            size = len(action) + len(source) + 2
+            if batch and (len(batch) >= self.bulk_size or
+                          batch_bytes + size > self.bulk_bytes):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append((result['object']['@id'], (action, source), dependency_data(result)))
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    def bulk_index(self, batch, xmin, record=False):
+        body = [line for path, lines, deps in batch if lines is not None for line in lines]
+        if not body:
+            return
+        try:
+            res = self.es.bulk(index=self.index, body=body, request_timeout=60)
+        except Exception:
+            log.warning('Error bulk indexing %d documents', len(body) // 2, exc_info=True)
+            return
+
+        # Conflicting documents were indexed at a newer version along with their
+        # dependencies so are skipped as with update_object.
+        failed = set()
+        if res.get('errors'):
+            for item in res['items']:
+                info = item['index']
+                status = info.get('status', 200)
+                if status == 409:
+                    log.warning('Conflict indexing %s at version %d', info['_id'], xmin)
+                    failed.add(info['_id'])
+                elif status >= 300:
+                    log.warning('Error indexing %s: %s', info['_id'], info.get('error'))
+                    failed.add(info['_id'])
+
+        if record:
+            record_dependencies([
+                deps for path, lines, deps in batch
+                if deps is not None and deps['uuid'] not in failed
+            ])
 
     def shutdown(self):
         pass
@@ -104,7 +104,15 @@ def update_object_in_snapshot(args):
     with snapshot(xmin, snapshot_id):
         request = get_current_request()
         indexer = request.registry[INDEXER]
-        return indexer.update_object(request, uuid, xmin)
+        return indexer.update_object(request, uuid, xmin, snapshot_id is not None)
+
+
+def bulk_update_objects_in_snapshot(args):
+    uuids, xmin, snapshot_id = args
+    with snapshot(xmin, snapshot_id):
+        request = get_current_request()
+        indexer = request.registry[INDEXER]
+        return indexer.bulk_update_objects(request, uuids, xmin, snapshot_id is not None)
 
 
 # Running in main process
@@ -127,18 +135,36 @@ class MPIndexer(Indexer):
         )
 
     def update_objects(self, request, uuids, xmin, snapshot_id):
+        if self.bulk:
+            return self.bulk_update_objects_pool(uuids, xmin, snapshot_id)
+
         # Ensure that we iterate over uuids in this thread not the pool task handler.
         tasks = [(uuid, xmin, snapshot_id) for uuid in uuids]
-        i = -1
         try:
-            for i, path in enumerate(self.pool.imap_unordered(
-                    update_object_in_snapshot, tasks, self.chunksize)):
-                if (i + 1) % 50 == 0:
-                    log.info('Indexing %s %d', path, i + 1)
+            # Dependencies are returned by the workers and recorded here in batches.
+            return self.record_results(self.pool.imap_unordered(
+                update_object_in_snapshot, tasks, self.chunksize))
+        except:
+            self.shutdown()
+            raise
+
+    def bulk_update_objects_pool(self, uuids, xmin, snapshot_id):
+        # Each task is a batch of uuids indexed by a worker with one _bulk request
+        # per ``bulk_size`` documents.
+        uuids = list(uuids)
+        tasks = [
+            (uuids[start:start + self.bulk_size], xmin, snapshot_id)
+            for start in range(0, len(uuids), self.bulk_size)
+        ]
+        count = 0
+        try:
+            for indexed in self.pool.imap_unordered(bulk_update_objects_in_snapshot, tasks):
+                count += indexed
+                log.info('Indexing %d', count)
         except:
             self.shutdown()
             raise
-        return i + 1
+        return count
 
     def shutdown(self):
         if 'pool' in self.__dict__:
@@ -7,6 +7,8 @@ from pyramid.compat import (
     unquote_bytes_to_wsgi,
 )
 from pyramid.httpexceptions import HTTPNotFound
+from urllib.parse import unquote
+from uuid import UUID
 import logging
 log = logging.getLogger(__name__)
 
@@ -50,10 +52,14 @@ embed_cache = ManagerLRUCache('embed_cache')
 
 def embed(request, *elements, **kw):
     """ as_user=True for current user
+
+    Cached results are copied unless frozen=True, in which case the cached
+    frame itself is returned and must not be modified.
     """
     # Should really be more careful about what gets included instead.
     # Cache cut response time from ~800ms to ~420ms.
     as_user = kw.get('as_user')
+    frozen = kw.get('frozen', False)
     path = join(*elements)
     path = unquote_bytes_to_wsgi(native_(path))
     log.debug('embed: %s', path)
@@ -65,7 +71,8 @@ def embed(request, *elements, **kw):
             cached = _embed(request, path)
             embed_cache[path] = cached
         result, embedded, linked = cached
-        result = deepcopy(result)
+        if not frozen:
+            result = deepcopy(result)
     request._embedded_uuids.update(embedded)
     request._linked_uuids.update(linked)
     return result
@@ -85,25 +92,126 @@ def _embed(request, path, as_user='EMBED'):
     return result, subreq._embedded_uuids, subreq._linked_uuids
 
 
-def expand_path(request, obj, path):
-    if isinstance(path, basestring):
-        path = path.split('.')
-    if not path:
+def compile_paths(paths):
+    """ Merge dotted embedded paths into a prefix trie of nested dicts.
+
+    Shared prefixes are stored once, ``['a.b', 'a.c']`` becomes
+    ``{'a': {'b': {}, 'c': {}}}``.
+    """
+    trie = {}
+    for path in paths:
+        node = trie
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return trie
+
+
+def expand_paths(request, obj, paths):
+    """ Return a copy of ``obj`` with the embedded paths expanded.
+
+    ``paths`` is a list of dotted paths or a trie from compile_paths. Links
+    are embedded level by level, all those needed at one depth of the embed
+    tree are prefetched together so each level costs a single storage query
+    rather than one per link. Only the containers along the expanded paths
+    are copied, the embedded frames are shared with the embed cache so the
+    result must not be modified in place.
+    """
+    if not isinstance(paths, dict):
+        paths = compile_paths(paths)
+    frames = {}
+    level = [(obj, paths)]
+    while level:
+        prefetch_level(request, level)
+        next_level = []
+        for obj_, trie in level:
+            for name, children in trie.items():
+                value = obj_.get(name, None)
+                if value is None:
+                    continue
+                for member in (value if isinstance(value, list) else [value]):
+                    if not isinstance(member, dict):
+                        frame = frames.get(member)
+                        if frame is None:
+                            frame = frames[member] = request.embed(
+                                member, '@@object', frozen=True)
+                        member = frame
+                    if children:
+                        next_level.append((member, children))
+        level = next_level
+    return _build_expanded(obj, paths, frames)
+
+
+def _build_expanded(obj, trie, frames):
+    if not isinstance(obj, dict):
+        obj = frames[obj]
+    if not trie:
+        return obj
+    result = obj.copy()
+    for name, children in trie.items():
+        value = obj.get(name, None)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            result[name] = [_build_expanded(member, children, frames) for member in value]
+        else:
+            result[name] = _build_expanded(value, children, frames)
+    return result
+
+
+def prefetch_level(request, level):
+    links = []
+    for obj, trie in level:
+        for name in trie:
+            value = obj.get(name, None)
+            if isinstance(value, list):
+                links.extend(v for v in value if isinstance(v, basestring))
+            elif isinstance(value, basestring):
+                links.append(value)
+    prefetch_paths(request, links)
+
+
+def prefetch_paths(request, paths):
+    """ Batch load the items behind resource paths which are not yet embedded.
+    """
+    root = request.root
+    if getattr(root, 'connection', None) is None:
         return
-    name = path[0]
-    remaining = path[1:]
-    value = obj.get(name, None)
-    if value is None:
+    names = []
+    for path in paths:
+        if embed_cache.get(unquote_bytes_to_wsgi(native_(join(path, '@@object')))) is not None:
+            continue
+        parts = [part for part in path.split('/') if part]
+        if len(parts) != 2:
+            continue
+        collection_name, name = parts
+        names.append((root.collections.get(unquote(collection_name)), name))
+    prefetch_names(root, names)
+
+
+def prefetch_names(root, names):
+    """ Batch load items from (collection, quoted name) pairs.
+
+    Names are either uuids or values of the collection's unique key, which are
+    loaded with one query per key.
+    """
+    connection = getattr(root, 'connection', None)
+    if connection is None:
         return
-    if isinstance(value, list):
-        for index, member in enumerate(value):
-            if not isinstance(member, dict):
-                member = value[index] = request.embed(member, '@@object')
-            expand_path(request, member, remaining)
-    else:
-        if not isinstance(value, dict):
-            value = obj[name] = request.embed(value, '@@object')
-        expand_path(request, value, remaining)
+    uuids = set()
+    unique_keys = {}
+    for collection, name in names:
+        name = unquote(name)
+        try:
+            uuids.add(str(UUID(name)))
+            continue
+        except ValueError:
+            pass
+        unique_key = getattr(collection, 'unique_key', None)
+        if unique_key is not None:
+            unique_keys.setdefault(unique_key, set()).add(name)
+    connection.prefetch(uuids)
+    for unique_key, names in unique_keys.items():
+        connection.prefetch_unique_keys(unique_key, names)
 
 
 class NullRenderer:
@@ -10,13 +10,141 @@ from . import (
     Created,
     simple_path_ids,
 )
+from .storage import DBSession
+import json
+import logging
+import os
+import pyramid.tweens
+import threading
 import transaction
 
+log = logging.getLogger(__name__)
+TRANSACTION_LISTENER = 'transaction_listener'
+
 
 def includeme(config):
     config.scan(__name__)
     config.add_request_method(lambda request: defaultdict(set), '_updated_uuid_paths', reify=True)
     config.add_request_method(lambda request: {}, '_initial_back_rev_links', reify=True)
+    config.add_tween(
+        'contentbase.invalidation.invalidation_tween_factory', under=pyramid.tweens.INGRESS)
+
+
+class Invalidated(object):
+    """ Notified once a transaction has committed.
+
+    ``updated`` and ``renamed`` are the uuid lists recorded for the transaction.
+    ``everything`` is set when notifications may have been missed so that
+    caches must be cleared.
+    """
+    def __init__(self, registry, updated=(), renamed=(), everything=False):
+        self.registry = registry
+        self.updated = updated
+        self.renamed = renamed
+        self.everything = everything
+
+
+def listen_for_invalidation(config, subscriber):
+    """ Subscribe a process wide cache to committed transactions.
+
+    Local commits are notified directly, commits from other processes are
+    picked up from the contentbase.transaction NOTIFY channel.
+    """
+    registry = config.registry
+    if TRANSACTION_LISTENER not in registry:
+        registry[TRANSACTION_LISTENER] = TransactionListener()
+    config.add_subscriber(subscriber, Invalidated)
+
+
+def listener_engine():
+    """ Returns the engine to listen for commits from other processes on.
+
+    None unless the session is bound to postgresql.
+    """
+    engine = getattr(DBSession.bind, 'engine', None)
+    if engine is None or engine.url.drivername != 'postgresql':
+        return None
+    return engine
+
+
+class TransactionListener(object):
+    channel = 'contentbase.transaction'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.conn = None
+
+    def connect(self):
+        engine = listener_engine()
+        if engine is None:
+            return None
+        connection = engine.pool.unique_connection()
+        connection.detach()
+        conn = connection.connection
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute('LISTEN "%s";' % self.channel)
+        return conn
+
+    def poll(self):
+        """ Return the transaction data committed since the last poll
+
+        Returns None when notifications may have been lost.
+        """
+        with self.lock:
+            # Never share a connection with a forked parent.
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.conn = self.connect()
+                return []
+            if self.conn is None:
+                return []
+            try:
+                self.conn.poll()
+                xids = [int(notify.payload) for notify in self.conn.notifies]
+                del self.conn.notifies[:]
+                if not xids:
+                    return []
+                with self.conn.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT data FROM transactions WHERE xid = ANY(%s);", (xids,))
+                    rows = cursor.fetchall()
+            except Exception:
+                log.warning('Lost transaction listener connection', exc_info=True)
+                self.pid = None
+                return None
+        return [json.loads(data) if isinstance(data, str) else data for data, in rows]
+
+
+def notify_invalidated(registry, records):
+    if records is None:
+        registry.notify(Invalidated(registry, everything=True))
+        return
+    updated = set()
+    renamed = set()
+    for data in records:
+        updated.update((data or {}).get('updated', ()))
+        renamed.update((data or {}).get('renamed', ()))
+    if updated or renamed:
+        registry.notify(Invalidated(registry, updated, renamed))
+
+
+def invalidation_tween_factory(handler, registry):
+    listener = registry.get(TRANSACTION_LISTENER)
+    if listener is None:
+        return handler
+
+    def invalidation_tween(request):
+        notify_invalidated(registry, listener.poll())
+        return handler(request)
+
+    return invalidation_tween
+
+
+def invalidate_after_commit(success, registry, updated, renamed):
+    if success:
+        notify_invalidated(registry, [{'updated': updated, 'renamed': renamed}])
 
 
 @subscriber(Created)
@@ -77,6 +205,10 @@ def es_update_data(event):
     ]
     updated = data['updated'] = list(updated_uuid_paths.keys())
 
+    if TRANSACTION_LISTENER in request.registry:
+        txn.addAfterCommitHook(
+            invalidate_after_commit, (request.registry, updated, renamed))
+
     response = request.response
     response.headers['X-Updated'] = ','.join(updated)
     if renamed:
@@ -3,48 +3,121 @@ import json
 import pyramid.renderers
 import uuid
 
+# Streamed responses are written in chunks of about this many bytes.
+BUFFER_SIZE = 64 * 1024
+
 
 def includeme(config):
+    settings = config.registry.settings
+    backend = settings.get('contentbase.json_renderer.backend')
+    if backend:
+        json_renderer.set_backend(backend)
     config.add_renderer(None, json_renderer)
 
 
-class JSON(pyramid.renderers.JSON):
-    '''Provide easier access to the configured serializer
-    '''
-    def dumps(self, value):
-        request = get_current_request()
-        default = self._make_default(request)
-        return json.dumps(value, default=default, **self.kw)
+class StdlibBackend(object):
+    """ Serialize with the json module.
+
+    ``json.dumps`` uses the C accelerated encoder whereas ``json.dump`` to a
+    file always uses the pure Python one, so output is built as one string.
+    """
+    def __init__(self):
+        self.module = json
 
+    def dumps(self, value, **kw):
+        return self.module.dumps(value, **kw)
 
-class BinaryFromJSON:
-    def __init__(self, app_iter):
-        self.app_iter = app_iter
+    def dumpb(self, value, **kw):
+        return self.dumps(value, **kw).encode('utf-8')
 
-    def __len__(self):
-        return len(self.app_iter)
 
-    def __iter__(self):
-        for s in self.app_iter:
-            yield s.encode('utf-8')
+class SimplejsonBackend(StdlibBackend):
+    def __init__(self):
+        import simplejson
+        self.module = simplejson
+
 
+class OrjsonBackend(object):
+    """ Serialize with orjson when installed.
 
-class JSONResult(object):
+    Output is compact and not ASCII escaped. Only the ``default`` keyword is
+    supported.
+    """
     def __init__(self):
-        self.app_iter = []
-        self.write = self.app_iter.append
+        import orjson
+        self.orjson = orjson
+        self.option = orjson.OPT_NON_STR_KEYS
+
+    def dumpb(self, value, default=None, **kw):
+        if kw:
+            raise TypeError('Unsupported arguments: %s' % ', '.join(sorted(kw)))
+        return self.orjson.dumps(value, default=default, option=self.option)
 
-    @classmethod
-    def serializer(cls, value, **kw):
-        fp = cls()
-        json.dump(value, fp, **kw)
-        if str is bytes:
-            return fp.app_iter
-        else:
-            return BinaryFromJSON(fp.app_iter)
+    def dumps(self, value, **kw):
+        return self.dumpb(value, **kw).decode('utf-8')
 
 
-json_renderer = JSON(serializer=JSONResult.serializer)
+BACKENDS = {
+    'json': StdlibBackend,
+    'simplejson': SimplejsonBackend,
+    'orjson': OrjsonBackend,
+}
+
+
+class JSON(pyramid.renderers.JSON):
+    '''Provide easier access to the configured serializer
+    '''
+    def __init__(self, backend='json', **kw):
+        super(JSON, self).__init__(serializer=self.dumpb, **kw)
+        self.set_backend(backend)
+
+    def set_backend(self, name):
+        self.backend_name = name
+        self.backend = BACKENDS[name]()
+
+    def dumpb(self, value, **kw):
+        """ The renderer serializer, returns the response body as bytes.
+        """
+        return self.backend.dumpb(value, **kw)
+
+    def dumps(self, value):
+        request = get_current_request()
+        default = self._make_default(request)
+        return self.backend.dumps(value, default=default, **self.kw)
+
+
+json_renderer = JSON()
+
+
+def json_stream(value, name, iterable):
+    """ Serialize ``value`` as an app_iter writing ``value[name]`` lazily.
+
+    Members of the ``name`` array are pulled from ``iterable`` and encoded
+    one at a time so the full list is never held in memory. Encoded members
+    are yielded in chunks of about ``BUFFER_SIZE`` bytes.
+    """
+    marker = '__json_stream_%s__' % uuid.uuid4().hex
+    value = value.copy()
+    value[name] = marker
+    before, after = json_renderer.dumps(value).split(json.dumps(marker), 1)
+
+    def app_iter():
+        chunk = [(before + '[').encode('utf-8')]
+        size = 0
+        separator = b''
+        for member in iterable:
+            data = separator + json_renderer.dumps(member).encode('utf-8')
+            chunk.append(data)
+            size += len(data)
+            separator = b', '
+            if size >= BUFFER_SIZE:
+                yield b''.join(chunk)
+                chunk = []
+                size = 0
+        chunk.append((']' + after).encode('utf-8'))
+        yield b''.join(chunk)
+
+    return app_iter()
 
 
 def uuid_adapter(obj, request):
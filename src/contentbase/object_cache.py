@@ -0,0 +1,86 @@
+""" Process wide cache of rendered @@object frames.
+
+Entries are keyed by (view name, uuid, tid, principals) and removed when a
+committed transaction updates anything they embed or renames anything they
+link to. Enable by setting ``contentbase.object_cache.capacity``.
+
+The cache is bypassed by write requests, which may render frames from
+uncommitted state that is never invalidated if the transaction aborts.
+"""
+from copy import deepcopy
+from pyramid.events import NewRequest
+from pyramid.settings import asbool
+from .cache import DependencyLRUCache
+from .stats import stats_incr
+from .util import get_root_request
+
+OBJECT_CACHE = 'object_cache'
+
+
+def includeme(config):
+    from .invalidation import listen_for_invalidation
+    settings = config.registry.settings
+    capacity = int(settings.get('contentbase.object_cache.capacity', 0))
+    # The indexer renders at a fixed snapshot so must not see newer frames.
+    if not capacity or asbool(settings.get('indexer')):
+        return
+    config.registry[OBJECT_CACHE] = DependencyLRUCache(capacity)
+    listen_for_invalidation(config, invalidate_object_cache)
+    config.add_subscriber(record_generation, NewRequest)
+
+
+def invalidate_object_cache(event):
+    cache = event.registry[OBJECT_CACHE]
+    if event.everything:
+        cache.clear()
+    else:
+        cache.invalidate(event.updated, event.renamed)
+
+
+def record_generation(event):
+    request = event.request
+    if request.__parent__ is None:
+        # Anything invalidated after this point may not be visible in our snapshot.
+        request._object_cache_generation = request.registry[OBJECT_CACHE].generation
+
+
+def cached_object_frame(view_callable):
+    """ View decorator serving frames from the process wide object cache.
+
+    Cached frames are shared and must not be modified, ``request.embed``
+    copies them unless called with frozen=True.
+    """
+    def wrapped(context, request):
+        cache = request.registry.get(OBJECT_CACHE)
+        root = get_root_request()
+        generation = getattr(root, '_object_cache_generation', None)
+        if cache is None or generation is None:
+            return view_callable(context, request)
+        # Frames rendered while writing may see uncommitted state.
+        if root.method not in ('GET', 'HEAD') or root._updated_uuid_paths:
+            return view_callable(context, request)
+
+        key = (
+            request.view_name,
+            str(context.uuid),
+            str(context.tid),
+            tuple(sorted(request.effective_principals)),
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            stats_incr('object_cache_hits')
+            result, embedded, linked = cached
+            request._embedded_uuids.update(embedded)
+            request._linked_uuids.update(linked)
+            return result
+
+        stats_incr('object_cache_misses')
+        result = view_callable(context, request)
+        evicted = cache.set(
+            key, deepcopy(result), request._embedded_uuids, request._linked_uuids,
+            generation=generation)
+        if evicted:
+            stats_incr('object_cache_evictions', evicted)
+        return result
+
+    return wrapped
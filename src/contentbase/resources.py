@@ -47,10 +47,15 @@ from .calculated import (
     calculated_property,
 )
 from .embedding import (
+    compile_paths,
     embed,
-    expand_path,
+    expand_paths,
+)
+from .object_cache import cached_object_frame
+from .schema_utils import (
+    compile_validator,
+    validate_request,
 )
-from .schema_utils import validate_request
 from .storage import RDBStorage
 from collections import (
     defaultdict,
@@ -70,6 +75,9 @@ _marker = object()
 
 logger = logging.getLogger(__name__)
 
+# Upgraded properties keyed by (uuid, tid), the stored document is immutable.
+upgrade_cache = ManagerLRUCache('contentbase.upgrade_cache', 1000)
+
 
 def includeme(config):
     registry = config.registry
@@ -253,6 +261,7 @@ class TypeInfo(AbstractTypeInfo):
         self.factory = factory
         self.base_types = factory.base_types
         self.embedded = factory.embedded
+        self.embedded_trie = compile_paths(factory.embedded)
 
     @reify
     def schema_version(self):
@@ -296,8 +305,14 @@ class TypeInfo(AbstractTypeInfo):
         for name, prop in props.items():
             if prop.schema is not None:
                 schema['properties'][name] = prop.schema
+        # Holds the validator registered for the schema while the type exists.
+        self.schema_validator = compile_validator(schema)
         return schema
 
+    @reify
+    def schema_validator(self):
+        return compile_validator(self.schema)
+
     @reify
     def schema_rev_links(self):
         revs = {}
@@ -409,6 +424,42 @@ class Connection(object):
         self.item_cache[uuid] = item
         return item
 
+    def prefetch(self, uuids):
+        """ Load the items for ``uuids`` into the item cache in one batch
+        """
+        uuids = {str(uuid) for uuid in uuids if str(uuid) not in self.item_cache}
+        if not uuids:
+            return
+        for model in self.storage.get_many_by_uuid(uuids):
+            self._cache_model(model)
+
+    def prefetch_unique_keys(self, unique_key, names):
+        """ Load the items for ``names`` of ``unique_key`` in one batch
+        """
+        names = {name for name in names if (unique_key, name) not in self.unique_key_cache}
+        if not names:
+            return
+        for model in self.storage.get_many_by_unique_key(unique_key, names):
+            item = self._cache_model(model)
+            if item is None:
+                continue
+            for name in item.unique_keys(item.properties).get(unique_key, ()):
+                self.unique_key_cache[(unique_key, name)] = model.uuid
+
+    def _cache_model(self, model):
+        uuid = str(model.uuid)
+        cached = self.item_cache.get(uuid)
+        if cached is not None:
+            return cached
+        try:
+            Item = self.types[model.item_type].factory
+        except KeyError:
+            return None
+        item = Item(self.registry, model)
+        model.used_for(item)
+        self.item_cache[uuid] = item
+        return item
+
     def get_rev_links(self, model, rel, *item_types):
         return self.storage.get_rev_links(model, rel, *item_types)
 
@@ -607,22 +658,35 @@ class Item(object):
         }
 
     def upgrade_properties(self):
-        properties = deepcopy(self.properties)
-        current_version = properties.get('schema_version', '')
+        current_version = self.properties.get('schema_version', '')
         target_version = self.type_info.schema_version
-        if target_version is not None and current_version != target_version:
-            migrator = self.registry['migrator']
-            try:
-                properties = migrator.upgrade(
-                    self.item_type, properties, current_version, target_version,
-                    context=self, registry=self.registry)
-            except RuntimeError:
-                raise
-            except Exception:
-                logger.warning(
-                    'Unable to upgrade %s from %r to %r',
-                    resource_path(self.__parent__, self.uuid),
-                    current_version, target_version, exc_info=True)
+        if target_version is None or current_version == target_version:
+            return deepcopy(self.properties)
+
+        # Unflushed changes have no tid yet.
+        tid = self.tid
+        key = (self.uuid, tid)
+        if tid is not None:
+            cached = upgrade_cache.get(key)
+            if cached is not None:
+                return deepcopy(cached)
+
+        properties = deepcopy(self.properties)
+        migrator = self.registry['migrator']
+        try:
+            properties = migrator.upgrade(
+                self.item_type, properties, current_version, target_version,
+                context=self, registry=self.registry)
+        except RuntimeError:
+            raise
+        except Exception:
+            logger.warning(
+                'Unable to upgrade %s from %r to %r',
+                resource_path(self.__parent__, self.uuid),
+                current_version, target_version, exc_info=True)
+            return properties
+        if tid is not None:
+            upgrade_cache[key] = deepcopy(properties)
         return properties
 
     def __json__(self, request):
@@ -684,13 +748,19 @@ class Item(object):
         return str(self.uuid)
 
 
+def tid_etag(request):
+    """ An etag listing the tid of each item embedded by the request
+    """
+    root = request.root
+    embedded = (root.get_by_uuid(uuid) for uuid in sorted(request._embedded_uuids))
+    uuid_tid = ((item.uuid, item.tid) for item in embedded)
+    return '&'.join('%s=%s' % (u, t) for u, t in uuid_tid)
+
+
 def etag_tid(view_callable):
     def wrapped(context, request):
         result = view_callable(context, request)
-        root = request.root
-        embedded = (root.get_by_uuid(uuid) for uuid in sorted(request._embedded_uuids))
-        uuid_tid = ((item.uuid, item.tid) for item in embedded)
-        request.response.etag = '&'.join('%s=%s' % (u, t) for u, t in uuid_tid)
+        request.response.etag = tid_etag(request)
         cache_control = request.response.cache_control
         cache_control.private = True
         cache_control.max_age = 0
@@ -978,7 +1048,7 @@ def uuid_to_path(request, obj, path):
 
 
 @view_config(context=Item, permission='view', request_method='GET',
-             name='object')
+             name='object', decorator=cached_object_frame)
 @view_config(context=Item, permission='view', request_method='GET',
              name='details')
 def item_view_object(context, request):
@@ -998,10 +1068,8 @@ def item_view_object(context, request):
              name='embedded')
 def item_view_embedded(context, request):
     item_path = request.resource_path(context)
-    properties = request.embed(item_path, '@@object')
-    for path in context.embedded:
-        expand_path(request, properties, path)
-    return properties
+    properties = request.embed(item_path, '@@object', frozen=True)
+    return expand_paths(request, properties, context.type_info.embedded_trie)
 
 
 @view_config(context=Item, permission='view', request_method='GET',
@@ -1024,7 +1092,7 @@ def item_actions(context, request):
              name='page')
 def item_view_page(context, request):
     item_path = request.resource_path(context)
-    properties = request.embed(item_path, '@@embedded')
+    properties = request.embed(item_path, '@@embedded', frozen=True).copy()
     actions = request.embed(item_path, '@@actions', as_user=True)['actions']
     if actions:
         properties['actions'] = actions
@@ -1037,10 +1105,8 @@ def item_view_page(context, request):
              name='expand')
 def item_view_expand(context, request):
     path = request.resource_path(context)
-    properties = request.embed(path, '@@object')
-    for path in request.params.getall('expand'):
-        expand_path(request, properties, path)
-    return properties
+    properties = request.embed(path, '@@object', frozen=True)
+    return expand_paths(request, properties, request.params.getall('expand'))
 
 
 def expand_column(request, obj, subset, path):
@@ -1061,13 +1127,13 @@ def expand_column(request, obj, subset, path):
             subset[name] = [{} for i in range(len(value))]
         for index, member in enumerate(value):
             if not isinstance(member, dict):
-                member = request.embed(member, '@@object')
+                member = request.embed(member, '@@object', frozen=True)
             expand_column(request, member, subset[name][index], remaining)
     else:
         if name not in subset:
             subset[name] = {}
         if not isinstance(value, dict):
-            value = request.embed(value, '@@object')
+            value = request.embed(value, '@@object', frozen=True)
         expand_column(request, value, subset[name], remaining)
 
 
@@ -1075,7 +1141,7 @@ def expand_column(request, obj, subset, path):
              name='columns')
 def item_view_columns(context, request):
     path = request.resource_path(context)
-    properties = request.embed(path, '@@object')
+    properties = request.embed(path, '@@object', frozen=True)
     if context.schema is None or 'columns' not in context.schema:
         return properties
 
@@ -33,19 +33,61 @@ def node(item_type, props):
     yield '  </table>>];'
 
 
-def edges(source, name, linkTo, exclude, subclasses):
+def link_targets(linkTo, subclasses):
     if isinstance(linkTo, basestring):
         if linkTo in subclasses:
-            linkTo = subclasses[linkTo]
-        else:
-            linkTo = [linkTo]
+            return subclasses[linkTo]
+        return [linkTo]
+    return linkTo
+
+
+def edges(source, name, linkTo, exclude, subclasses):
     exclude = [source] + exclude
     return [
         '{source}:{name} -> {target}:uuid;'.format(source=source, name=quoteattr(name), target=target)
-        for target in linkTo if target not in exclude
+        for target in link_targets(linkTo, subclasses) if target not in exclude
     ]
 
 
+def type_subclasses(types):
+    subclasses = defaultdict(list)
+    for source, type_info in sorted(types.items()):
+        for base in type_info.base_types[:-1]:
+            subclasses[base].append(source)
+    return subclasses
+
+
+def schema_links(schema):
+    """ Yield the linkTo of every link in a schema, including nested objects.
+    """
+    if 'linkTo' in schema:
+        yield schema['linkTo']
+    items = schema.get('items')
+    if isinstance(items, dict):
+        for link_to in schema_links(items):
+            yield link_to
+    for prop in schema.get('properties', {}).values():
+        if prop.get('calculatedProperty'):
+            continue
+        for link_to in schema_links(prop):
+            yield link_to
+
+
+def dependencies(types):
+    """ Map each item type to the set of other types it links to.
+    """
+    subclasses = type_subclasses(types)
+    result = {}
+    for source, type_info in types.items():
+        targets = result[source] = set()
+        if type_info.schema is None:
+            continue
+        for link_to in schema_links(type_info.schema):
+            targets.update(link_targets(link_to, subclasses))
+        targets.discard(source)
+    return result
+
+
 def digraph(types, exclude=None):
     if not exclude:
         exclude = ['submitted_by', 'lab', 'award']
@@ -54,10 +96,7 @@ def digraph(types, exclude=None):
         'rankdir=LR',
     ]
 
-    subclasses = defaultdict(list)
-    for source, type_info in sorted(types.items()):
-        for base in type_info.base_types[:-1]:
-            subclasses[base].append(source)
+    subclasses = type_subclasses(types)
 
     for source, type_info in sorted(types.items()):
         if type_info.schema is None:
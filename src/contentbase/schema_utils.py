@@ -1,3 +1,4 @@
+from past.builtins import basestring
 from pyramid.path import (
     AssetResolver,
     caller_package,
@@ -9,18 +10,27 @@ import json
 import codecs
 import collections
 import copy
+import threading
+import weakref
 from jsonschema import (
     Draft4Validator,
     FormatChecker,
     RefResolver,
 )
 from jsonschema.exceptions import ValidationError
+from urllib.parse import unquote
 from uuid import UUID
+from .embedding import prefetch_names
 
 
 SERVER_DEFAULTS = {}
 
 
+def includeme(config):
+    config.add_request_method(lambda request: {}, '_link_cache', reify=True)
+    config.add_request_method(submits_for, '_submits_for', reify=True)
+
+
 def server_default(func):
     SERVER_DEFAULTS[func.__name__] = func
 
@@ -62,6 +72,78 @@ def mixinProperties(schema, resolver):
     return schema
 
 
+def resolve_link(request, base, instance):
+    """ Find a link target, caching those found for the rest of the request.
+
+    Raises KeyError when not found. Misses are not cached as the item may yet
+    be created within the request.
+    """
+    cache = request._link_cache
+    key = (base.__name__, instance)
+    item = cache.get(key)
+    if item is None:
+        item = find_resource(base, instance.replace(':', '%3A'))
+        if item is None:
+            raise KeyError(instance)
+        cache[key] = item
+    return item
+
+
+def submits_for(request):
+    """ The uuids the current user may submit for, None when unrestricted.
+    """
+    userid = None
+    for principal in request.effective_principals:
+        if principal.startswith('userid.'):
+            userid = principal[len('userid.'):]
+            break
+    if userid is None:
+        return None
+    user = request.root[userid]
+    uuids = user.upgrade_properties().get('submits_for')
+    if uuids is None or request.has_permission('submit_for_any'):
+        return None
+    return {UUID(uuid) for uuid in uuids}
+
+
+def iter_links(schema, instance):
+    """ Yield (linkTo, value) for the link values in an instance.
+    """
+    if isinstance(instance, list):
+        items = schema.get('items')
+        if isinstance(items, dict):
+            for value in instance:
+                for link in iter_links(items, value):
+                    yield link
+    elif isinstance(instance, dict):
+        properties = schema.get('properties', {})
+        for name, value in instance.items():
+            if name in properties:
+                for link in iter_links(properties[name], value):
+                    yield link
+    elif isinstance(instance, basestring) and 'linkTo' in schema:
+        yield schema['linkTo'], instance
+
+
+def prefetch_links(request, schema, instance):
+    """ Load the targets of all links in an instance with one query per key.
+    """
+    root = request.root
+    if getattr(root, 'connection', None) is None:
+        return
+    names = []
+    for link_to, value in iter_links(schema, instance):
+        parts = [part for part in value.split('/') if part]
+        if len(parts) == 1:
+            collection = root.by_item_type.get(link_to) if isinstance(link_to, basestring) else None
+        elif len(parts) == 2:
+            collection = root.collections.get(unquote(parts[0]))
+        else:
+            continue
+        names.append((collection, parts[-1]))
+    prefetch_names(root, names)
+
+
 def linkTo(validator, linkTo, instance, schema):
     # avoid circular import
     from contentbase import Item
@@ -78,9 +160,7 @@ def linkTo(validator, linkTo, instance, schema):
     else:
         raise Exception("Bad schema")  # raise some sort of schema error
     try:
-        item = find_resource(base, instance.replace(':', '%3A'))
-        if item is None:
-            raise KeyError()
+        item = resolve_link(request, base, instance)
     except KeyError:
         error = "%r not found" % instance
         yield ValidationError(error)
@@ -106,20 +186,11 @@ def linkTo(validator, linkTo, instance, schema):
             return
 
     if schema.get('linkSubmitsFor'):
-        userid = None
-        for principal in request.effective_principals:
-            if principal.startswith('userid.'):
-                userid = principal[len('userid.'):]
-                break
-        if userid is not None:
-            user = request.root[userid]
-            submits_for = user.upgrade_properties().get('submits_for')
-            if (submits_for is not None and
-                    not any(UUID(uuid) == item.uuid for uuid in submits_for) and
-                    not request.has_permission('submit_for_any')):
-                error = "%r is not in user submits_for" % instance
-                yield ValidationError(error)
-                return
+        allowed = request._submits_for
+        if allowed is not None and item.uuid not in allowed:
+            error = "%r is not in user submits_for" % instance
+            yield ValidationError(error)
+            return
 
     # And normalize the value to a uuid
     if validator._serialize:
@@ -135,9 +206,7 @@ def linkFrom(validator, linkFrom, instance, schema):
         request = get_current_request()
         base = request.root.by_item_type[linkType]
         try:
-            item = find_resource(base, instance.replace(':', '%3A'))
-            if item is None:
-                raise KeyError()
+            item = resolve_link(request, base, instance)
         except KeyError:
             error = "%r not found" % instance
             yield ValidationError(error)
@@ -161,10 +230,7 @@ def linkFrom(validator, linkFrom, instance, schema):
 
         # treat the link property as not required
         # because it will be filled in when the child is created/updated
-        subschema = request.registry[TYPES][linkType].schema
-        subschema = copy.deepcopy(subschema)
-        if linkProp in subschema['required']:
-            subschema['required'].remove(linkProp)
+        subschema = request.registry[TYPES][linkType].schema_validator.without_required(linkProp)
 
         for error in validator.descend(instance, subschema):
             yield error
@@ -259,10 +325,80 @@ def load_schema(filename):
     return schema
 
 
+class CompiledValidator(object):
+    """ A schema validator prepared once for a schema.
+
+    Mixins have been expanded by load_schema so the resolver is only needed
+    for the meta schemas. Validators hold the resolution scope and the
+    serialized result while validating so one is kept per thread.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self._local = threading.local()
+        self._without_required = {}
+
+    def _validator(self):
+        resolver = NoRemoteResolver.from_schema(self.schema)
+        return SchemaValidator(
+            self.schema, resolver=resolver, serialize=True, format_checker=format_checker)
+
+    def serialize(self, data):
+        """ Returns the validated data and a list of errors.
+        """
+        local = self._local
+        # Should validation of this schema reenter use a fresh validator.
+        if getattr(local, 'busy', False):
+            return self._validator().serialize(data)
+        validator = getattr(local, 'validator', None)
+        if validator is None:
+            validator = local.validator = self._validator()
+        local.busy = True
+        try:
+            return validator.serialize(data)
+        finally:
+            local.busy = False
+
+    def without_required(self, name):
+        """ The schema with ``name`` not required, as used by linkFrom.
+        """
+        schema = self._without_required.get(name)
+        if schema is None:
+            schema = copy.deepcopy(self.schema)
+            if name in schema.get('required', ()):
+                schema['required'].remove(name)
+            self._without_required[name] = schema
+        return schema
+
+
+# Keyed by schema id. The validator holds a reference to its schema so the
+# id cannot be reused while an entry exists, entries are dropped once the
+# owner of the validator (a TypeInfo) is gone.
+COMPILED_VALIDATORS = weakref.WeakValueDictionary()
+
+
+def compile_validator(schema):
+    """ Returns a CompiledValidator for a schema.
+
+    The caller must keep a reference to it for ``validate`` to use it.
+    """
+    compiled = COMPILED_VALIDATORS.get(id(schema))
+    if compiled is None or compiled.schema is not schema:
+        compiled = COMPILED_VALIDATORS[id(schema)] = CompiledValidator(schema)
+    return compiled
+
+
 def validate(schema, data, current=None):
-    resolver = NoRemoteResolver.from_schema(schema)
-    sv = SchemaValidator(schema, resolver=resolver, serialize=True, format_checker=format_checker)
-    validated, errors = sv.serialize(data)
+    request = get_current_request()
+    if request is not None:
+        prefetch_links(request, schema, data)
+    compiled = COMPILED_VALIDATORS.get(id(schema))
+    if compiled is not None and compiled.schema is schema:
+        validated, errors = compiled.serialize(data)
+    else:
+        resolver = NoRemoteResolver.from_schema(schema)
+        sv = SchemaValidator(
+            schema, resolver=resolver, serialize=True, format_checker=format_checker)
+        validated, errors = sv.serialize(data)
 
     filtered_errors = []
     for error in errors:
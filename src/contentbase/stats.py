@@ -11,6 +11,18 @@ def includeme(config):
     config.add_tween('contentbase.stats.stats_tween_factory', under=pyramid.tweens.INGRESS)
 
 
+def stats_incr(key, value=1):
+    """ Add to a counter in the X-Stats of the current root request.
+    """
+    request = get_root_request()
+    if request is None:
+        return
+    stats = getattr(request, '_stats', None)
+    if stats is None:
+        return
+    stats[key] = stats.get(key, 0) + value
+
+
 def requests_timing_hook(prefix='requests'):
     count_key = prefix + '_count'
     time_key = prefix + '_time'
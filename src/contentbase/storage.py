@@ -64,6 +64,40 @@ class RDBStorage(object):
         else:
             return key.resource
 
+    def get_many_by_uuid(self, rids):
+        ''' Load resources and their current propsheets with a single query.
+
+        Loaded models are held in the session identity map so subsequent
+        ``get_by_uuid`` calls for them do not hit the database.
+        '''
+        rids = [uuid.UUID(str(rid)) for rid in rids]
+        if not rids:
+            return []
+        session = DBSession()
+        query = session.query(Resource).options(
+            orm.joinedload_all(
+                Resource.data,
+                CurrentPropertySheet.propsheet,
+                innerjoin=True,
+            ),
+        ).filter(Resource.rid.in_(rids))
+        return query.all()
+
+    def get_many_by_unique_key(self, unique_key, names):
+        names = list(names)
+        if not names:
+            return []
+        session = DBSession()
+        query = session.query(Key).options(
+            orm.joinedload_all(
+                Key.resource,
+                Resource.data,
+                CurrentPropertySheet.propsheet,
+                innerjoin=True,
+            ),
+        ).filter(Key.name == unique_key, Key.value.in_(names))
+        return [key.resource for key in query.all()]
+
     def get_rev_links(self, model, rel, *item_types):
         if item_types:
             return [
@@ -290,6 +324,18 @@ class Link(Base):
         'Resource', foreign_keys=[target_rid], backref='revs')
 
 
+class Dependency(Base):
+    """ Reverse dependencies of indexed documents
+
+    Records which uuids each indexed document embeds or links to so that
+    invalidation is an indexed lookup on target.
+    """
+    __tablename__ = 'dependencies'
+    source_rid = Column('source', UUID, primary_key=True)
+    rel = Column(types.String, primary_key=True)  # 'embedded' or 'linked'
+    target_rid = Column('target', UUID, primary_key=True, index=True)
+
+
 class PropertySheet(Base):
     '''A triple describing a resource
     '''
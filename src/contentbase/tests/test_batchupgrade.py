@@ -0,0 +1,31 @@
+def test_batched():
+    from contentbase.batchupgrade import batched
+    assert list(batched(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_checkpoint(tmpdir):
+    from contentbase.batchupgrade import Checkpoint
+    path = str(tmpdir.join('upgrade.ckpt'))
+    checkpoint = Checkpoint(path)
+    assert ['a', 'b'] not in checkpoint
+    checkpoint.record('a', 'b', 2)
+    checkpoint.close()
+
+    checkpoint = Checkpoint(path)
+    assert ['a', 'b'] in checkpoint
+    assert ['a', 'c'] not in checkpoint
+    checkpoint.close()
+
+
+def test_wait_result():
+    import pytest
+    import queue
+    from contentbase.batchupgrade import wait_result
+    done = queue.Queue()
+    done.put({'results': []})
+    done.put(ValueError('worker failed'))
+    assert wait_result(done, 1) == {'results': []}
+    with pytest.raises(ValueError):
+        wait_result(done, 1)
+    with pytest.raises(RuntimeError):
+        wait_result(done, 0.01)
@@ -0,0 +1,83 @@
+def test_dependency_cache_lru():
+    from contentbase.cache import DependencyLRUCache
+    cache = DependencyLRUCache(2)
+    assert cache.set('a', 1) == 0
+    assert cache.set('b', 2) == 0
+    assert cache.get('a') == (1, frozenset(), frozenset())
+    assert cache.set('c', 3) == 1
+    assert 'b' not in cache
+    assert 'a' in cache
+    assert cache.hits == 1
+    assert cache.get('b') is None
+    assert cache.misses == 1
+    assert cache.evictions == 1
+
+
+def test_dependency_cache_invalidate():
+    from contentbase.cache import DependencyLRUCache
+    cache = DependencyLRUCache(10)
+    cache.set('a', 1, embedded=['u1', 'u2'], linked=['u3'])
+    cache.set('b', 2, embedded=['u2'])
+    cache.set('c', 3, embedded=['u4'], linked=['u1'])
+    assert cache.invalidate(updated=['u3']) == 0
+    assert cache.invalidate(renamed=['u3']) == 1
+    assert 'a' not in cache
+    assert cache.invalidate(updated=['u2', 'u4']) == 2
+    assert len(cache) == 0
+
+
+def test_dependency_cache_generation():
+    from contentbase.cache import DependencyLRUCache
+    cache = DependencyLRUCache(10)
+    generation = cache.generation
+    cache.invalidate(updated=['u1'])
+    cache.set('a', 1, generation=generation)
+    assert 'a' not in cache
+    cache.set('a', 1, generation=cache.generation)
+    assert 'a' in cache
+
+
+def test_object_cache_skips_write_requests(monkeypatch):
+    from collections import defaultdict
+    from contentbase import object_cache
+    from contentbase.cache import DependencyLRUCache
+
+    class Request(object):
+        view_name = 'object'
+        effective_principals = ['system.Everyone']
+
+        def __init__(self, cache, method):
+            self.registry = {object_cache.OBJECT_CACHE: cache}
+            self.method = method
+            self._object_cache_generation = cache.generation
+            self._updated_uuid_paths = defaultdict(set)
+            self._embedded_uuids = set()
+            self._linked_uuids = set()
+
+    class Context(object):
+        uuid = 'u1'
+        tid = 1
+
+    calls = []
+
+    def view(context, request):
+        calls.append(request.method)
+        return {'uuid': context.uuid}
+
+    cache = DependencyLRUCache(10)
+    wrapped = object_cache.cached_object_frame(view)
+    request = Request(cache, 'POST')
+    monkeypatch.setattr(object_cache, 'get_root_request', lambda: request)
+    wrapped(Context(), request)
+    assert len(cache) == 0
+
+    request = Request(cache, 'GET')
+    request._updated_uuid_paths['u2']
+    wrapped(Context(), request)
+    assert len(cache) == 0
+
+    request = Request(cache, 'GET')
+    wrapped(Context(), request)
+    assert wrapped(Context(), request) == {'uuid': 'u1'}
+    assert len(cache) == 1
+    assert calls == ['POST', 'GET', 'GET']
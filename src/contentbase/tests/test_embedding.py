@@ -0,0 +1,61 @@
+def test_compile_paths():
+    from contentbase.embedding import compile_paths
+    trie = compile_paths(['a', 'a.b', 'a.b.c', 'a.d', 'e.f'])
+    assert trie == {'a': {'b': {'c': {}}, 'd': {}}, 'e': {'f': {}}}
+
+
+class DummyRequest(object):
+    root = None
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.embedded = []
+
+    def embed(self, path, view, frozen=False):
+        self.embedded.append(path)
+        return self.objects[path]
+
+
+def test_expand_paths_level_order():
+    from contentbase.embedding import (
+        compile_paths,
+        expand_paths,
+    )
+    objects = {
+        '/a/1/': {'@id': '/a/1/', 'b': ['/b/1/', '/b/2/']},
+        '/b/1/': {'@id': '/b/1/', 'c': '/c/1/'},
+        '/b/2/': {'@id': '/b/2/', 'c': '/c/1/'},
+        '/c/1/': {'@id': '/c/1/'},
+    }
+    request = DummyRequest(objects)
+    obj = {'a': '/a/1/', 'other': '/b/1/'}
+    result = expand_paths(request, obj, compile_paths(['a', 'a.b', 'a.b.c']))
+    assert request.embedded == ['/a/1/', '/b/1/', '/b/2/', '/c/1/']
+    assert result['a']['b'][1]['c'] == {'@id': '/c/1/'}
+    assert result['a']['b'][0]['c'] is result['a']['b'][1]['c']
+    assert result['other'] == '/b/1/'
+    # Neither the original nor the embedded frames are modified
+    assert obj == {'a': '/a/1/', 'other': '/b/1/'}
+    assert objects['/a/1/']['b'] == ['/b/1/', '/b/2/']
+
+
+def test_prefetch_names_unquotes():
+    from contentbase.embedding import prefetch_names
+
+    class Connection(object):
+        def prefetch(self, uuids):
+            self.uuids = uuids
+
+        def prefetch_unique_keys(self, unique_key, names):
+            self.unique_keys = (unique_key, names)
+
+    class Collection(object):
+        unique_key = 'disease:term'
+
+    class Root(object):
+        connection = Connection()
+
+    uuid = '4c2d8bb0-57a1-4a3b-a2ef-1fb8f8a1a2c9'
+    prefetch_names(Root(), [(Collection(), 'Heart%20disease'), (None, uuid)])
+    assert Root.connection.uuids == {uuid}
+    assert Root.connection.unique_keys == ('disease:term', {'Heart disease'})
@@ -0,0 +1,73 @@
+class DummyES(object):
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def mget(self, index, body):
+        self.calls.append(('mget', body['ids']))
+        return {'docs': [
+            {'_id': uuid, '_version': 1, '_source': self.docs[uuid], 'found': True}
+            if uuid in self.docs else {'_id': uuid, 'found': False}
+            for uuid in body['ids']
+        ]}
+
+    def search(self, index, body):
+        self.calls.append(('search', body))
+        (term, names), = body['filter']['terms'].items()
+        unique_key = term.split('.', 1)[1]
+        return {'hits': {'hits': [
+            {'_id': uuid, '_version': 1, '_source': source}
+            for uuid, source in sorted(self.docs.items())
+            if set(names) & set(source['unique_keys'].get(unique_key, ()))
+        ]}}
+
+
+DOCS = {
+    'a': {'uuid': 'a', 'item_type': 'gene', 'unique_keys': {'gene:symbol': ['A1']}},
+    'b': {'uuid': 'b', 'item_type': 'gene', 'unique_keys': {'gene:symbol': ['B1']}},
+}
+
+
+def test_get_many_by_uuid_single_mget():
+    from contentbase.elasticsearch.esstorage import ElasticSearchStorage
+    es = DummyES(DOCS)
+    storage = ElasticSearchStorage(es, 'index')
+    models = storage.get_many_by_uuid(['a', 'b', 'missing'])
+    assert sorted(model.uuid for model in models) == ['a', 'b']
+    assert es.calls == [('mget', ['a', 'b', 'missing'])]
+
+
+def test_get_many_by_unique_key_single_search():
+    from contentbase.elasticsearch.esstorage import ElasticSearchStorage
+    es = DummyES(DOCS)
+    storage = ElasticSearchStorage(es, 'index')
+    models = storage.get_many_by_unique_key('gene:symbol', ['A1', 'B1', 'C1'])
+    assert sorted(model.uuid for model in models) == ['a', 'b']
+    assert len(es.calls) == 1
+
+
+def test_recent_edits_invalidates():
+    from contentbase.elasticsearch.esstorage import RecentEdits
+    edits = RecentEdits([[20, ['u2'], []], [10, ['u1'], ['l1']]])
+    source = {'embedded_uuids': ['x', 'u1'], 'linked_uuids': []}
+    assert edits.invalidates(source, 5)
+    assert edits.invalidates(source, 10)
+    assert not edits.invalidates(source, 11)
+    assert not edits.invalidates(source, 21)
+    assert edits.invalidates({'embedded_uuids': [], 'linked_uuids': ['l1']}, 10)
+    assert edits.updated == {'u1', 'u2'}
+    assert not RecentEdits()
+
+
+def test_exclude_invalidated_filter(monkeypatch):
+    from contentbase.elasticsearch import esstorage
+
+    class DummyRequest(object):
+        _recent_edits = esstorage.RecentEdits([[10, ['u1'], []]])
+
+    monkeypatch.setattr(esstorage, 'get_root_request', lambda: DummyRequest())
+    storage = esstorage.ElasticSearchStorage(None, 'index', exclude_invalidated=True)
+    assert storage._filter({'term': {'uuid': 'a'}}) == {'and': [
+        {'term': {'uuid': 'a'}},
+        {'not': {'or': [{'terms': {'embedded_uuids': ['u1'], '_cache': False}}]}},
+    ]}
@@ -0,0 +1,28 @@
+import json
+import pytest
+import uuid
+
+
+@pytest.mark.parametrize('backend', ['json', 'simplejson'])
+def test_json_renderer_backend_adapters(backend):
+    from contentbase.json_renderer import JSON
+    from contentbase.json_renderer import listy_adapter, uuid_adapter
+    renderer = JSON(backend=backend)
+    renderer.add_adapter(uuid.UUID, uuid_adapter)
+    renderer.add_adapter(set, listy_adapter)
+    value = {'uuid': uuid.UUID(int=1), 'links': {'a'}, 'name': 'é'}
+    expected = {'uuid': str(uuid.UUID(int=1)), 'links': ['a'], 'name': 'é'}
+    assert json.loads(renderer.dumps(value)) == expected
+    default = renderer._make_default(None)
+    body = renderer.dumpb(value, default=default)
+    assert isinstance(body, bytes)
+    assert json.loads(body.decode('utf-8')) == expected
+
+
+def test_json_stream_buffers(monkeypatch):
+    from contentbase import json_renderer
+    monkeypatch.setattr(json_renderer, 'BUFFER_SIZE', 100)
+    members = [{'@id': '/items/%d/' % i, 'value': 'x' * 20} for i in range(50)]
+    chunks = list(json_renderer.json_stream({'total': 50}, '@graph', iter(members)))
+    assert 1 < len(chunks) < 50
+    assert json.loads(b''.join(chunks).decode('utf-8')) == {'total': 50, '@graph': members}
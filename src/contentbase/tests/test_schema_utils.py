@@ -0,0 +1,66 @@
+def test_iter_links():
+    from contentbase.schema_utils import iter_links
+    schema = {
+        'properties': {
+            'gene': {'type': 'string', 'linkTo': 'gene'},
+            'articles': {'type': 'array', 'items': {'type': 'string', 'linkTo': 'article'}},
+            'nested': {
+                'type': 'object',
+                'properties': {'lab': {'type': 'string', 'linkTo': ['lab', 'award']}},
+            },
+            'label': {'type': 'string'},
+        },
+    }
+    instance = {
+        'gene': 'HGNC:1',
+        'articles': ['/articles/1/', 'PMID:2'],
+        'nested': {'lab': 'some-lab'},
+        'label': 'not a link',
+    }
+    assert sorted(iter_links(schema, instance), key=repr) == sorted([
+        ('gene', 'HGNC:1'),
+        ('article', '/articles/1/'),
+        ('article', 'PMID:2'),
+        (['lab', 'award'], 'some-lab'),
+    ], key=repr)
+
+
+def test_compile_validator_without_required():
+    from contentbase.schema_utils import compile_validator
+    schema = {
+        'type': 'object',
+        'required': ['parent', 'name'],
+        'properties': {'parent': {'type': 'string'}, 'name': {'type': 'string'}},
+    }
+    compiled = compile_validator(schema)
+    assert compile_validator(schema) is compiled
+    assert compile_validator(dict(schema)) is not compiled
+    subschema = compiled.without_required('parent')
+    assert subschema['required'] == ['name']
+    assert schema['required'] == ['parent', 'name']
+    assert compiled.without_required('parent') is subschema
+
+
+def test_compiled_validators_are_weak():
+    import gc
+    from contentbase.schema_utils import (
+        COMPILED_VALIDATORS,
+        compile_validator,
+    )
+    schema = {'type': 'object', 'properties': {}}
+    compile_validator(schema)
+    gc.collect()
+    assert id(schema) not in COMPILED_VALIDATORS
+
+
+def test_compiled_validator_reused():
+    from contentbase.schema_utils import compile_validator
+    schema = {'type': 'object', 'properties': {'name': {'type': 'string'}}}
+    compiled = compile_validator(schema)
+    validated, errors = compiled.serialize({'name': 'a'})
+    assert validated == {'name': 'a'}
+    assert not errors
+    validator = compiled._local.validator
+    validated, errors = compiled.serialize({'name': 1})
+    assert errors
+    assert compiled._local.validator is validator
@@ -37,6 +37,20 @@ def test_finalizer(schema_migrator):
     assert value['schema_version'] == '3'
 
 
+def test_upgrade_path(schema_migrator):
+    steps, version = schema_migrator.upgrade_path('', '3')
+    assert [step.step for step in steps] == [step1, step2]
+    assert version == '3'
+    assert schema_migrator.upgrade_path('', '3') is schema_migrator.upgrade_path('', '3')
+    assert schema_migrator.upgrade_path('2', '3')[0][0].step is step2
+
+
+def test_upgrade_path_not_found(schema_migrator):
+    from contentbase.upgrader import UpgradePathNotFound
+    with pytest.raises(UpgradePathNotFound):
+        schema_migrator.upgrade_path('', '4')
+
+
 def test_declarative_config():
     from pyramid.config import Configurator
     config = Configurator()
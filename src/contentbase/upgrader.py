@@ -1,4 +1,5 @@
-from pkg_resources import parse_version
+from functools import lru_cache
+from pkg_resources import parse_version as _parse_version
 from pyramid.interfaces import (
     PHASE1_CONFIG,
     PHASE2_CONFIG,
@@ -6,6 +7,11 @@ from pyramid.interfaces import (
 import venusian
 
 
+@lru_cache(maxsize=1000)
+def parse_version(version):
+    return _parse_version(version)
+
+
 def includeme(config):
     config.registry['migrator'] = Migrator()
     config.add_directive('add_upgrade', add_upgrade)
@@ -69,6 +75,7 @@ class SchemaMigrator(object):
         self.version = version
         self.upgrade_steps = {}
         self.finalizer = finalizer
+        self._paths = {}
 
     def add_upgrade_step(self, step, source='', dest=None):
         if dest is None:
@@ -78,10 +85,18 @@ class SchemaMigrator(object):
         if parse_version(source) in self.upgrade_steps:
             raise ConfigurationError('duplicate step for source', source)
         self.upgrade_steps[parse_version(source)] = UpgradeStep(step, source, dest)
+        self._paths.clear()
 
-    def upgrade(self, value, current_version='', target_version=None, **kw):
-        if target_version is None:
-            target_version = self.version
+    def upgrade_path(self, current_version, target_version):
+        """ Return the steps upgrading current_version to target_version.
+
+        Paths are computed once per pair of versions.
+        """
+        key = (current_version, target_version)
+        try:
+            return self._paths[key]
+        except KeyError:
+            pass
 
         if parse_version(current_version) > parse_version(target_version):
             raise VersionTooHigh(self.__name__, current_version, target_version)
@@ -113,6 +128,15 @@ class SchemaMigrator(object):
             raise UpgradePathNotFound(
                 self.__name__, current_version, target_version, version)
 
+        path = self._paths[key] = (tuple(steps), version)
+        return path
+
+    def upgrade(self, value, current_version='', target_version=None, **kw):
+        if target_version is None:
+            target_version = self.version
+
+        steps, version = self.upgrade_path(current_version, target_version)
+
         # Apply the steps
 
         system = {}